@@ -0,0 +1,90 @@
+import time
+import tracemalloc
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает процессорное время и память на запрос у JSON API '
+        'и HTML-страниц с теми же данными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько раз запрашивать каждую страницу.',
+        )
+        parser.add_argument(
+            '--cached', action='store_true',
+            help='Не чистить кеш между запросами.',
+        )
+
+    def pairs(self):
+        post = Post.objects.filter(group__isnull=False).first()
+        if post is None:
+            raise CommandError(
+                'Нет постов с группой: сначала запустите seed_posts.'
+            )
+        group, author = post.group.slug, post.author.username
+        return (
+            ('лента', reverse('posts:index'), reverse('api:posts')),
+            (
+                'группа',
+                reverse('posts:group_posts', kwargs={'slug': group}),
+                reverse('api:posts') + f'?group={group}',
+            ),
+            (
+                'профиль',
+                reverse('posts:profile', kwargs={'username': author}),
+                reverse('api:posts') + f'?author={author}',
+            ),
+            (
+                'пост',
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+                reverse('api:post', kwargs={'post_id': post.pk}),
+            ),
+        )
+
+    def measure(self, url, count, cached):
+        """Среднее время CPU (мс) и пик памяти (КБ) на запрос."""
+        factory = RequestFactory()
+        match = resolve(url.split('?')[0])
+        cpu = peak = 0
+        for _ in range(count):
+            if not cached:
+                cache.clear()
+            request = factory.get(url)
+            request.user = AnonymousUser()
+            tracemalloc.start()
+            started = time.process_time()
+            response = match.func(request, *match.args, **match.kwargs)
+            response.content
+            cpu += time.process_time() - started
+            peak += tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return cpu / count * 1000, peak / count / 1024
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        self.stdout.write(
+            f'{"страница":<10}{"HTML, мс":>10}{"API, мс":>10}'
+            f'{"HTML, КБ":>10}{"API, КБ":>10}'
+        )
+        for name, html_url, api_url in self.pairs():
+            html_cpu, html_memory = self.measure(
+                html_url, count, options['cached']
+            )
+            api_cpu, api_memory = self.measure(
+                api_url, count, options['cached']
+            )
+            self.stdout.write(
+                f'{name:<10}{html_cpu:>10.2f}{api_cpu:>10.2f}'
+                f'{html_memory:>10.0f}{api_memory:>10.0f}'
+            )
@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.paginator import POSTS_PER_PAGE
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for i in range(POSTS_PER_PAGE + 3):
+            cls.post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_posts_pages_and_fields(self):
+        """Посты листаются курсором и отдают только выбранные поля."""
+        url = reverse('api:posts')
+        with self.assertNumQueries(1):
+            data = self.client.get(url, {'fields': 'id,author'}).json()
+        self.assertEqual(len(data['results']), POSTS_PER_PAGE)
+        self.assertEqual(
+            data['results'][0],
+            {'id': ApiTests.post.pk, 'author': 'author'},
+        )
+        self.assertIsNone(data['previous'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(set(data['results'][0]), {'id', 'author'})
+        self.assertIsNone(data['next'])
+
+    def test_post_detail(self):
+        """Пост отдаётся со всеми полями, автор и группа — именами."""
+        data = self.client.get(
+            reverse('api:post', kwargs={'post_id': ApiTests.post.pk})
+        ).json()
+        self.assertEqual(data['group'], 'group')
+        self.assertEqual(data['author'], 'author')
+        self.assertIsNone(data['image'])
+
+    def test_comments_groups_follows(self):
+        """Комментарии, группы и подписки доступны только для чтения."""
+        comments = self.client.get(reverse(
+            'api:post_comments', kwargs={'post_id': ApiTests.post.pk}
+        )).json()
+        self.assertEqual(comments['results'][0]['author'], 'reader')
+        groups = self.client.get(reverse('api:groups')).json()
+        self.assertEqual(groups['results'][0]['slug'], 'group')
+        self.client.force_login(ApiTests.reader)
+        follows = self.client.get(reverse('api:follows')).json()
+        self.assertEqual(
+            follows['results'][0],
+            {'id': follows['results'][0]['id'],
+             'user': 'reader', 'author': 'author'},
+        )
+        response = self.client.post(reverse('api:groups'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_follows_only_own_and_logged_in(self):
+        """Подписки видит только их владелец."""
+        response = self.client.get(reverse('api:follows'))
+        self.assertEqual(response.status_code, 401)
+        self.client.force_login(ApiTests.author)
+        follows = self.client.get(reverse('api:follows')).json()
+        self.assertEqual(follows['results'], [])
+
+    def test_errors_in_json(self):
+        """Ошибки возвращаются в JSON с нужным кодом."""
+        response = self.client.get(reverse('api:posts'), {'fields': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('x', response.json()['error'])
+        response = self.client.get(
+            reverse('api:post', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
+
+    def test_benchmark_command(self):
+        """Бенчмарк печатает строку на каждую пару страниц."""
+        out = StringIO()
+        call_command('benchmark_api', requests=1, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
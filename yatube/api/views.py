@@ -0,0 +1,223 @@
+"""JSON API v1 только для чтения.
+
+Ответы собираются из .values() тех же запросов, что и у HTML-лент:
+экземпляры моделей не создаются, читаются только запрошенные поля.
+Посты и комментарии листаются курсором, как HTML-страницы, группы
+и подписки — по id (?after=). Поля выбираются параметром ?fields=.
+Подписки видит только их владелец: граф подписок сайт не показывает.
+"""
+from functools import wraps
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from posts import caching
+from posts.models import Comment, Follow, Group, Post
+from posts.paginator import (COMMENTS_PER_PAGE, POSTS_PER_PAGE,
+                             CursorPaginator)
+
+GROUPS_PER_PAGE = 50
+FOLLOWS_PER_PAGE = 50
+
+# Имя поля в ответе: путь в ORM для values().
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'image_width': 'image_width',
+    'image_height': 'image_height',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+}
+GROUP_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'slug': 'slug',
+    'description': 'description',
+}
+FOLLOW_FIELDS = {
+    'id': 'id',
+    'user': 'user__username',
+    'author': 'author__username',
+}
+
+
+class BadRequest(Exception):
+    """Ошибка в параметрах запроса, уходит клиенту с кодом 400."""
+
+
+def api_view(view):
+    """Ошибки API отдаются в JSON, а не HTML-страницами."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        except Http404:
+            return JsonResponse({'error': 'Не найдено.'}, status=404)
+    return wrapper
+
+
+def login_required(view):
+    """Анониму — 401 в JSON, а не редирект на страницу входа."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Нужно войти.'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def selected_fields(request, fields):
+    """Поля из ?fields=id,text; по умолчанию все."""
+    names = [
+        name.strip() for name in request.GET.get('fields', '').split(',')
+        if name.strip()
+    ]
+    unknown = set(names) - set(fields)
+    if unknown:
+        raise BadRequest(
+            'Неизвестные поля: ' + ', '.join(sorted(unknown))
+        )
+    return names or list(fields)
+
+
+def values(queryset, fields, names, required=('id',)):
+    """Строки queryset только с нужными колонками.
+
+    required — поля, без которых не построить курсор.
+    """
+    paths = {fields[name] for name in names} | set(required)
+    return queryset.values(*paths)
+
+
+def serialize(row, fields, names):
+    data = {name: row[fields[name]] for name in names}
+    if 'image' in data:
+        image = data['image']
+        storage = Post._meta.get_field('image').storage
+        data['image'] = storage.url(image) if image else None
+    return data
+
+
+def page_url(request, **params):
+    query = request.GET.copy()
+    for name, value in params.items():
+        query[name] = value
+    return f'{request.path}?{query.urlencode()}'
+
+
+def cursor_response(request, queryset, fields, per_page):
+    """Страница по курсору ?cursor=, как в HTML-лентах."""
+    names = selected_fields(request, fields)
+    paginator = CursorPaginator(
+        values(queryset, fields, names, required=('id', 'pub_date')),
+        per_page,
+    )
+    page = paginator.get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [serialize(row, fields, names) for row in page],
+        'next': page.next_cursor and page_url(
+            request, cursor=page.next_cursor
+        ),
+        'previous': page.previous_cursor and page_url(
+            request, cursor=page.previous_cursor
+        ),
+    })
+
+
+def id_response(request, queryset, fields, per_page):
+    """Страница по возрастанию id после ?after=."""
+    names = selected_fields(request, fields)
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        raise BadRequest('after должен быть числом.')
+    rows = list(
+        values(queryset, fields, names).filter(pk__gt=after).order_by(
+            'pk'
+        )[:per_page + 1]
+    )
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    return JsonResponse({
+        'results': [serialize(row, fields, names) for row in rows],
+        'next': page_url(
+            request, after=rows[-1]['id']
+        ) if has_next else None,
+    })
+
+
+def global_scopes(request, *args, **kwargs):
+    return [caching.GLOBAL]
+
+
+def post_scopes(request, post_id):
+    return [('post', post_id)]
+
+
+def follow_scopes(request):
+    # Подписка и отписка выдают новую метку ленте подписчика.
+    return [('follower', request.user.pk)]
+
+
+@api_view
+@caching.cache_by_generation('api:posts', global_scopes)
+def posts(request):
+    queryset = Post.objects.feed()
+    if request.GET.get('group'):
+        queryset = queryset.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        queryset = queryset.filter(author__username=request.GET['author'])
+    return cursor_response(request, queryset, POST_FIELDS, POSTS_PER_PAGE)
+
+
+@api_view
+@caching.cache_by_generation('api:post', post_scopes)
+def post(request, post_id):
+    names = selected_fields(request, POST_FIELDS)
+    row = get_object_or_404(
+        values(Post.objects.feed(), POST_FIELDS, names), pk=post_id
+    )
+    return JsonResponse(serialize(row, POST_FIELDS, names))
+
+
+@api_view
+@caching.cache_by_generation('api:comments', post_scopes)
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return cursor_response(
+        request, Comment.objects.for_post(post_id), COMMENT_FIELDS,
+        COMMENTS_PER_PAGE,
+    )
+
+
+@api_view
+@caching.cache_by_generation('api:groups', global_scopes)
+def groups(request):
+    return id_response(
+        request, Group.objects.all(), GROUP_FIELDS, GROUPS_PER_PAGE
+    )
+
+
+@api_view
+@login_required
+@caching.cache_by_generation('api:follows', follow_scopes)
+def follows(request):
+    """Подписки текущего пользователя."""
+    queryset = Follow.objects.filter(user=request.user)
+    if request.GET.get('author'):
+        queryset = queryset.filter(author__username=request.GET['author'])
+    return id_response(request, queryset, FOLLOW_FIELDS, FOLLOWS_PER_PAGE)
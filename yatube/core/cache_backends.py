@@ -0,0 +1,222 @@
+"""Двухуровневый кеш: маленький LRU в процессе перед общим бэкендом.
+
+Общий уровень — любой кеш из settings.CACHES (файловый, Redis и т.п.),
+его видят все процессы gunicorn. Локальный уровень отдаёт горячие
+ключи без похода в общий.
+
+Согласованность между процессами держится на штампах версий:
+- ключи с префиксами из SHARED_ONLY_PREFIXES (метки поколений,
+  счётчики) никогда не кладутся локально и всегда читаются из общего
+  уровня — ими и инвалидируются страницы и карточки, чьи ключи
+  содержат эти метки и поэтому никогда не меняются;
+- любая перезапись или удаление ключа меняет общий штамп, и другие
+  процессы, заметив новый штамп (проверка не чаще STAMP_INTERVAL
+  секунд), сбрасывают свой локальный уровень. add() штамп не меняет:
+  он не перезаписывает существующих значений.
+"""
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+STAMP_KEY = 'two_tier:stamp'
+_MISSING = object()
+_local_tiers = {}
+
+
+class LocalTier:
+    """Ограниченный LRU процесса с собственным сроком жизни записей."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.stamp_checked = 0
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return _MISSING
+            value, expires = item
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return _MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, lifetime):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + lifetime)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TwoTierCache(BaseCache):
+    """LOCATION — алиас общего кеша в settings.CACHES.
+
+    OPTIONS: LOCAL_MAX_ENTRIES (1000), LOCAL_TIMEOUT — сколько секунд
+    запись живёт локально (60), STAMP_INTERVAL — как часто сверять
+    штамп (1), SHARED_ONLY_PREFIXES — ключи только для общего уровня,
+    LOCAL_NAME — имя локального уровня (по умолчанию LOCATION).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 60)
+        self.stamp_interval = options.get('STAMP_INTERVAL', 1)
+        self.shared_only = tuple(options.get('SHARED_ONLY_PREFIXES', ()))
+        # Backend создаётся на каждый поток, а локальный уровень общий
+        # для процесса — как у LocMemCache.
+        self.local = _local_tiers.setdefault(
+            options.get('LOCAL_NAME', location),
+            LocalTier(options.get('LOCAL_MAX_ENTRIES', 1000)),
+        )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_key(self, key, version):
+        if key.startswith(self.shared_only):
+            return None
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    def _lifetime(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def _sync(self, force=False):
+        """Сбрасывает локальный уровень, если другой процесс писал."""
+        local = self.local
+        now = time.monotonic()
+        if not force and now - local.stamp_checked < self.stamp_interval:
+            return
+        stamp = self.shared.get(STAMP_KEY)
+        if stamp != local.stamp:
+            local.clear()
+            local.stamp = stamp
+        local.stamp_checked = now
+
+    def _changed(self):
+        # Сначала сверка: иначе чужая запись с прошлой сверки
+        # потерялась бы под нашим новым штампом.
+        self._sync(force=True)
+        stamp = uuid4().hex
+        self.shared.set(STAMP_KEY, stamp, None)
+        self.local.stamp = stamp
+
+    def _remember(self, local_key, value, timeout=DEFAULT_TIMEOUT):
+        if local_key is not None:
+            self.local.put(local_key, value, self._lifetime(timeout))
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self._sync()
+            value = self.local.get(local_key)
+            if value is not _MISSING:
+                return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self._remember(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remote = []
+        self._sync()
+        for key in keys:
+            local_key = self._local_key(key, version)
+            value = self.local.get(local_key) if local_key else _MISSING
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        if remote:
+            fetched = self.shared.get_many(remote, version=version)
+            for key, value in fetched.items():
+                self._remember(self._local_key(key, version), value)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._remember(self._local_key(key, version), value, timeout)
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self._changed()
+        self._remember(local_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        local_keys = {key: self._local_key(key, version) for key in data}
+        if any(local_keys.values()):
+            self._changed()
+        for key, value in data.items():
+            self._remember(local_keys[key], value, timeout)
+        return failed or []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self.local.pop(local_key)
+            self._changed()
+        return value
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version=version)
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self.local.pop(local_key)
+            self._changed()
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(keys, version=version)
+        local_keys = [self._local_key(key, version) for key in keys]
+        for local_key in filter(None, local_keys):
+            self.local.pop(local_key)
+        if any(local_keys):
+            self._changed()
+
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+        self._changed()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,24 @@
+"""Настройка соединений SQLite для работы под нагрузкой.
+
+Каждое новое соединение получает PRAGMA из settings.SQLITE_PRAGMAS:
+WAL пускает читателей параллельно с писателем, synchronous=NORMAL
+в режиме WAL не теряет целостности, а busy_timeout заставляет
+писателя подождать блокировку, а не сразу падать с «database is
+locked». Соединения переживают запрос, если задан CONN_MAX_AGE.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, getattr(settings, 'SQLITE_PRAGMAS', {}))
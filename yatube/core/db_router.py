@@ -0,0 +1,73 @@
+"""Чтение с реплик, запись в основную базу.
+
+Реплики перечислены в settings.REPLICA_DATABASES; если список пуст,
+всё идёт в default. Чтение уходит в основную базу, когда:
+- идёт транзакция: в ней нужно видеть собственные изменения;
+- модель из PRIMARY_APPS: сессии и пользователи нужны свежими,
+  иначе только что вошедший окажется анонимом;
+- поток закреплён за основной базой (use_primary): так делает
+  PrimaryPinMiddleware для сессий, недавно что-то записавших.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_APPS = ('sessions', 'auth')
+
+_state = threading.local()
+
+
+def replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', 0) > 0
+
+
+@contextmanager
+def use_primary(pinned=True):
+    """Читать в этом потоке только из основной базы."""
+    _state.pinned = getattr(_state, 'pinned', 0) + bool(pinned)
+    try:
+        yield
+    finally:
+        _state.pinned -= bool(pinned)
+
+
+@contextmanager
+def track_writes():
+    """Отмечает, была ли запись; результат — в state.wrote."""
+    previous = getattr(_state, 'writes', None)
+    _state.writes = state = WriteState()
+    try:
+        yield state
+    finally:
+        _state.writes = previous
+
+
+class WriteState:
+    wrote = False
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (not replicas()
+                or is_pinned()
+                or model._meta.app_label in PRIMARY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        writes = getattr(_state, 'writes', None)
+        if writes is not None:
+            writes.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Все базы проекта — копии default, связи между ними допустимы.
+        return True
@@ -0,0 +1,259 @@
+"""Генератор нагрузки для команды load_test.
+
+Виртуальные клиенты — корутины asyncio, у каждого своё keep-alive
+соединение HTTP/1.1. Клиент выбирает сценарий по весам из смеси
+(MIX), ждёт ответ и сразу шлёт следующий запрос: нагрузка замкнутая,
+её уровень задаёт число клиентов. Залогиненные клиенты ходят
+с заранее созданной сессией и CSRF-токеном, без страницы входа.
+"""
+import asyncio
+import math
+import random
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY, get_user_model)
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+
+from posts.models import AuthorStats, Follow, Group, Post
+
+from .wsgi_server import ERROR_HEADER
+
+User = get_user_model()
+
+# Текст постов и комментариев нагрузочного теста: по нему они удаляются.
+MARKER = 'Нагрузочный тест'
+
+# Сценарий: вес в смеси по умолчанию.
+MIX = {
+    'index': 30,
+    'group_posts': 15,
+    'profile': 15,
+    'post_detail': 15,
+    'follow_index': 15,
+    'add_comment': 7,
+    'post_create': 3,
+}
+
+
+def parse_mix(value):
+    """«index=50,add_comment=5» в {сценарий: вес}."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in MIX:
+            raise ValueError(f'Неизвестный сценарий: {name}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Targets:
+    """Случайная выборка групп, авторов, постов и читателей из базы."""
+
+    def __init__(self, size=200):
+        self.groups = list(Group.objects.order_by('?').values_list(
+            'slug', flat=True
+        )[:size])
+        self.authors = list(AuthorStats.objects.filter(
+            posts__gt=0
+        ).order_by('?').values_list('user__username', flat=True)[:size])
+        if not self.authors:
+            # Счётчики не пересчитаны (rebuild_author_stats) — авторы
+            # берутся прямо из постов.
+            self.authors = list(set(Post.objects.order_by(
+                '?'
+            ).values_list('author__username', flat=True)[:size]))
+        self.posts = list(Post.objects.order_by('?').values_list(
+            'id', flat=True
+        )[:size])
+        self.readers = list(User.objects.filter(
+            pk__in=Follow.objects.values('user_id')
+        ).order_by('?')[:size])
+        if not (self.groups and self.authors and self.posts
+                and self.readers):
+            raise ValueError('Нет данных: сначала запустите seed_posts.')
+
+
+def login(user):
+    """Cookie залогиненного клиента и CSRF-токен для POST."""
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    request = HttpRequest()
+    token = get_token(request)
+    cookie = (
+        f'{settings.SESSION_COOKIE_NAME}={session.session_key}; '
+        f'{settings.CSRF_COOKIE_NAME}={request.META["CSRF_COOKIE"]}'
+    )
+    return session.session_key, cookie, token
+
+
+def scenario_request(name, rnd, targets):
+    """(метод, путь, тело, нужен ли вход) для сценария."""
+    if name == 'index':
+        return 'GET', '/', None, False
+    if name == 'group_posts':
+        return 'GET', f'/group/{rnd.choice(targets.groups)}/', None, False
+    if name == 'profile':
+        return (
+            'GET', f'/profile/{rnd.choice(targets.authors)}/', None, False
+        )
+    if name == 'post_detail':
+        return 'GET', f'/posts/{rnd.choice(targets.posts)}/', None, False
+    if name == 'follow_index':
+        return 'GET', '/follow/', None, True
+    if name == 'add_comment':
+        return (
+            'POST', f'/posts/{rnd.choice(targets.posts)}/comment/',
+            {'text': MARKER}, True,
+        )
+    return 'POST', '/create/', {'text': MARKER}, True
+
+
+class Connection:
+    """Keep-alive соединение HTTP/1.1; ответы читаются по Content-Length."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers, body=b''):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        lines.append(f'Content-Length: {len(body)}')
+        self.writer.write(
+            ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+        )
+        status_line = await self.reader.readuntil(b'\r\n')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        await self.reader.readexactly(
+            int(response_headers.get('content-length', 0))
+        )
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, response_headers
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Results:
+    """Задержки и ошибки по сценариям."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def add(self, name, latency, error=None):
+        self.latencies[name].append(latency)
+        if error:
+            self.errors[name][error] += 1
+
+    def summary(self, duration):
+        """{сценарий: метрики} и 'total' по всем запросам;
+        задержки в мс, ошибки — доля и виды."""
+        series = {
+            name: (self.latencies[name], self.errors[name])
+            for name in sorted(
+                self.latencies, key=lambda name: -len(self.latencies[name])
+            )
+        }
+        series['total'] = (
+            [value for values in self.latencies.values() for value in values],
+            sum(self.errors.values(), Counter()),
+        )
+        report = {}
+        for name, (latencies, errors) in series.items():
+            latencies = sorted(latencies)
+            count = len(latencies)
+            if not count:
+                continue
+            report[name] = {
+                'requests': count,
+                'rps': round(count / duration, 1),
+                **{
+                    f'p{p}_ms': round(
+                        latencies[max(math.ceil(p / 100 * count) - 1, 0)]
+                        * 1000, 2
+                    )
+                    for p in (50, 95, 99)
+                },
+                'max_ms': round(latencies[-1] * 1000, 2),
+                'error_rate': round(sum(errors.values()) / count, 4),
+                'errors': dict(errors.most_common()),
+            }
+        return report
+
+
+async def client(address, mix, targets, user, seed, deadline,
+                 warmup_until, results):
+    rnd = random.Random(seed)
+    connection = Connection(*address)
+    _, cookie, token = user
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        name = rnd.choices(names, weights)[0]
+        method, path, data, logged_in = scenario_request(
+            name, rnd, targets
+        )
+        headers = {}
+        body = b''
+        if logged_in:
+            headers['Cookie'] = cookie
+            headers['X-CSRFToken'] = token
+        if data is not None:
+            body = urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        started = time.monotonic()
+        try:
+            status, response_headers = await connection.request(
+                method, path, headers, body
+            )
+        except (OSError, asyncio.IncompleteReadError) as error:
+            connection.close()
+            error = f'{type(error).__name__}: {error}'
+        else:
+            error = response_headers.get(ERROR_HEADER.lower())
+            if error is None and status >= 400:
+                error = f'HTTP {status}'
+        if started >= warmup_until:
+            results.add(name, time.monotonic() - started, error)
+    connection.close()
+
+
+async def run(address, mix, targets, logins, concurrency, duration,
+              warmup, seed=0):
+    results = Results()
+    started = time.monotonic()
+    warmup_until = started + warmup
+    deadline = warmup_until + duration
+    await asyncio.gather(*(
+        client(
+            address, mix, targets, logins[i % len(logins)], seed + i,
+            deadline, warmup_until, results,
+        )
+        for i in range(concurrency)
+    ))
+    return results
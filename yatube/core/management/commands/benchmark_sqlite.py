@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'pub_date REAL, text TEXT)',
+    'CREATE INDEX post_author_date ON post (author_id, pub_date)',
+)
+AUTHORS = 100
+
+
+def connect(path, pragmas):
+    # Как у Django: автокоммит, таймаут sqlite3 по умолчанию.
+    connection = sqlite3.connect(path, isolation_level=None)
+    apply_pragmas(connection.cursor(), pragmas)
+    return connection
+
+
+def prepare(path, pragmas, rows):
+    connection = connect(path, pragmas)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    connection.execute('BEGIN')
+    connection.executemany(
+        'INSERT INTO post (author_id, pub_date, text) VALUES (?, ?, ?)',
+        ((i % AUTHORS, i, 'Текст поста ' * 20) for i in range(rows)),
+    )
+    connection.execute('COMMIT')
+    connection.close()
+
+
+def work(path, pragmas, duration, write_ratio, seed, results):
+    """Читает ленту автора или пишет пост, пока не выйдет время."""
+    rnd = random.Random(seed)
+    connection = connect(path, pragmas)
+    reads = writes = errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        author = rnd.randrange(AUTHORS)
+        try:
+            if rnd.random() < write_ratio:
+                connection.execute(
+                    'INSERT INTO post (author_id, pub_date, text) '
+                    'VALUES (?, ?, ?)',
+                    (author, time.time(), 'Новый пост'),
+                )
+                writes += 1
+            else:
+                connection.execute(
+                    'SELECT id, text FROM post WHERE author_id = ? '
+                    'ORDER BY pub_date DESC LIMIT 10', (author,),
+                ).fetchall()
+                reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    connection.close()
+    results.put((reads, writes, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает чтение и запись SQLite несколькими процессами '
+        'с PRAGMA из settings.SQLITE_PRAGMAS и без них.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=5,
+                            help='Секунд на каждый режим.')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Доля записей среди операций.')
+        parser.add_argument('--rows', type=int, default=10000,
+                            help='Сколько постов в базе перед замером.')
+
+    def run(self, directory, name, pragmas, options):
+        path = os.path.join(directory, f'{name}.sqlite3')
+        prepare(path, pragmas, options['rows'])
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=work, args=(
+                path, pragmas, options['duration'],
+                options['write_ratio'], seed, results,
+            ))
+            for seed in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        totals = [sum(column) for column in zip(
+            *(results.get() for _ in workers)
+        )]
+        for worker in workers:
+            worker.join()
+        return [total / options['duration'] for total in totals[:2]] + [
+            totals[2]
+        ]
+
+    def handle(self, *args, **options):
+        modes = (
+            ('default', {}),
+            ('tuned', settings.SQLITE_PRAGMAS),
+        )
+        self.stdout.write(
+            f'{"режим":<10}{"чтений/с":>12}{"записей/с":>12}{"ошибок":>10}'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for name, pragmas in modes:
+                reads, writes, errors = self.run(
+                    directory, name, pragmas, options
+                )
+                self.stdout.write(
+                    f'{name:<10}{reads:>12.0f}{writes:>12.0f}{errors:>10}'
+                )
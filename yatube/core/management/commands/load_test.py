@@ -0,0 +1,126 @@
+import asyncio
+import json
+import os
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import connections
+
+from core import loadtest, wsgi_server
+from posts.models import Comment, Post
+
+
+def load_app():
+    # Как в продакшене: без отладки и её панели.
+    settings.DEBUG = False
+    got_request_exception.connect(wsgi_server.remember_exception)
+    from yatube.wsgi import application
+    return application
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает yatube.wsgi.application в локальном многопроцессном '
+        'сервере и нагружает его смесью запросов по keep-alive '
+        'соединениям. Печатает пропускную способность, задержки '
+        'и ошибки по сценариям. Нужна база из seed_posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Процессов сервера.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=32,
+            help='Одновременных клиентов.',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help='Секунд замера.',
+        )
+        parser.add_argument(
+            '--warmup', type=float, default=3,
+            help='Секунд прогрева, не попадающих в отчёт.',
+        )
+        parser.add_argument(
+            '--mix',
+            help='Веса сценариев, например index=50,add_comment=5. '
+                 'Сценарии: ' + ', '.join(loadtest.MIX) + '.',
+        )
+        parser.add_argument(
+            '--logins', type=int, default=50,
+            help='Сколько разных пользователей залогинить.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Куда записать JSON.')
+        parser.add_argument(
+            '--keep-data', action='store_true',
+            help='Не удалять посты, комментарии и сессии теста.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadtest.parse_mix(options['mix']) if options['mix'] \
+                else loadtest.MIX
+            targets = loadtest.Targets()
+        except ValueError as error:
+            raise CommandError(error)
+        logins = [
+            loadtest.login(user)
+            for user in targets.readers[:options['logins']]
+        ]
+        # Воркеры после fork открывают свои соединения с базой.
+        connections.close_all()
+        address, processes = wsgi_server.start(load_app, options['workers'])
+        self.stdout.write(
+            f'Сервер http://{address[0]}:{address[1]}/, воркеров: '
+            f'{options["workers"]}, клиентов: {options["concurrency"]}.'
+        )
+        try:
+            results = asyncio.run(loadtest.run(
+                address, mix, targets, logins, options['concurrency'],
+                options['duration'], options['warmup'], options['seed'],
+            ))
+        finally:
+            wsgi_server.stop(processes)
+            if not options['keep_data']:
+                self.cleanup(logins)
+        report = results.summary(options['duration'])
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'workers': options['workers'],
+                    'concurrency': options['concurrency'],
+                    'duration': options['duration'],
+                    'mix': mix,
+                    'results': report,
+                }, file, ensure_ascii=False, indent=2)
+
+    def cleanup(self, logins):
+        Comment.objects.filter(text=loadtest.MARKER).delete()
+        Post.objects.filter(text=loadtest.MARKER).delete()
+        Session.objects.filter(
+            session_key__in=[session_key for session_key, *_ in logins]
+        ).delete()
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"сценарий":<14}{"запросов":>9}{"в сек":>8}{"p50, мс":>9}'
+            f'{"p95, мс":>9}{"p99, мс":>9}{"макс, мс":>10}{"ошибки":>8}'
+        )
+        for name, row in report.items():
+            self.stdout.write(
+                f'{name:<14}{row["requests"]:>9}{row["rps"]:>8.1f}'
+                f'{row["p50_ms"]:>9.1f}{row["p95_ms"]:>9.1f}'
+                f'{row["p99_ms"]:>9.1f}{row["max_ms"]:>10.1f}'
+                f'{row["error_rate"]:>8.1%}'
+            )
+        for name, row in report.items():
+            if name == 'total':
+                continue
+            for error, count in row['errors'].items():
+                self.stdout.write(f'{name}: {count} × {error}')
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.replication import replicate
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в реплики с заданной задержкой.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=1,
+            help='Секунд между копиями.',
+        )
+        parser.add_argument(
+            '--once', action='store_true', help='Скопировать один раз.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            replicate()
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,189 @@
+"""Метрики запросов в памяти процесса и их выдача в формате Prometheus.
+
+PerformanceMiddleware заводит на время запроса RequestStats: время
+запросов к базе считает execute_wrapper, время шаблонов —
+TimedDjangoTemplates, попадания в кеш отмечают сами кеширующие места
+через count_cache(). По окончании запроса всё складывается
+в гистограммы с меткой view. Каждый процесс копит свои метрики:
+Prometheus опрашивает процессы по отдельности и суммирует сам.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+_state = threading.local()
+_lock = threading.Lock()
+
+TIME_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class RequestStats:
+    """Что успел сделать один запрос."""
+
+    def __init__(self, keep_queries=False):
+        self.keep_queries = keep_queries
+        self.queries = []
+        self.query_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache = defaultdict(int)
+
+    def top_queries(self, count):
+        """Самые долгие запросы с числом повторов: [(время, n, sql)]."""
+        grouped = {}
+        for sql, elapsed in self.queries:
+            total, repeats = grouped.get(sql, (0.0, 0))
+            grouped[sql] = (total + elapsed, repeats + 1)
+        return sorted(
+            ((total, repeats, sql)
+             for sql, (total, repeats) in grouped.items()),
+            reverse=True,
+        )[:count]
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: засекает каждый запрос к базе.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.query_count += 1
+            self.db_time += elapsed
+            if self.keep_queries:
+                self.queries.append((sql, elapsed))
+
+
+def current():
+    """RequestStats текущего запроса или None вне запроса."""
+    return getattr(_state, 'stats', None)
+
+
+def activate(stats):
+    _state.stats = stats
+
+
+def deactivate():
+    _state.stats = None
+
+
+def count_cache(name, hits=0, misses=0):
+    stats = current()
+    if stats is not None:
+        stats.cache[name, 'hit'] += hits
+        stats.cache[name, 'miss'] += misses
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # labels -> [счётчики по корзинам (+Inf последней), сумма].
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [
+                [0] * (len(self.buckets) + 1), 0.0
+            ]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield (
+                    f'{self.name}_bucket'
+                    f'{format_labels(labels + (("le", bound),))} '
+                    f'{cumulative}'
+                )
+            yield f'{self.name}_sum{format_labels(labels)} {total}'
+            yield f'{self.name}_count{format_labels(labels)} {cumulative}'
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.series = defaultdict(int)
+
+    def inc(self, labels, value=1):
+        self.series[labels] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.series.items()):
+            yield f'{self.name}{format_labels(labels)} {value}'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for name, value in labels
+    )
+    return '{' + ','.join(
+        f'{name}="{value}"' for name, value in escaped
+    ) + '}'
+
+
+REQUEST_TIME = Histogram(
+    'yatube_request_duration_seconds',
+    'Время ответа вьюхи целиком.', TIME_BUCKETS,
+)
+DB_TIME = Histogram(
+    'yatube_db_duration_seconds',
+    'Суммарное время запросов к базе за один ответ.', TIME_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    'yatube_db_queries',
+    'Число запросов к базе за один ответ.', QUERY_BUCKETS,
+)
+TEMPLATE_TIME = Histogram(
+    'yatube_template_duration_seconds',
+    'Время рендеринга шаблонов за один ответ.', TIME_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total',
+    'Обращения к кешу страниц и карточек: попадания и промахи.',
+)
+METRICS = (REQUEST_TIME, DB_TIME, DB_QUERIES, TEMPLATE_TIME, CACHE_REQUESTS)
+
+
+def observe(view, duration, stats):
+    labels = (('view', view),)
+    with _lock:
+        REQUEST_TIME.observe(labels, duration)
+        DB_TIME.observe(labels, stats.db_time)
+        DB_QUERIES.observe(labels, stats.query_count)
+        TEMPLATE_TIME.observe(labels, stats.template_time)
+        for (name, result), value in stats.cache.items():
+            if value:
+                CACHE_REQUESTS.inc(
+                    labels + (('cache', name), ('result', result)), value
+                )
+
+
+def render():
+    with _lock:
+        lines = [line for metric in METRICS for line in metric.render()]
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        for metric in METRICS:
+            metric.series.clear()
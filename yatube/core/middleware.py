@@ -0,0 +1,113 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import db_router, metrics, nplusone
+
+PIN_COOKIE = 'primary_pin'
+
+logger = logging.getLogger(__name__)
+
+
+class PrimaryPinMiddleware:
+    """Читает свои записи: после записи сессия на REPLICA_PIN_SECONDS
+    закрепляется за основной базой, пока реплики догоняют."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = PIN_COOKIE in request.COOKIES
+        with db_router.use_primary(pinned), \
+                db_router.track_writes() as writes:
+            response = self.get_response(request)
+        if writes.wrote and db_router.replicas():
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+            )
+        return response
+
+
+class PerformanceMiddleware:
+    """Время ответа, запросы к базе, шаблоны и кеш каждой вьюхи.
+
+    Счётчики и время пишутся для всех запросов, тексты SQL — только
+    для доли METRICS_SAMPLE_RATE: из них медленные запросы (дольше
+    METRICS_SLOW_SECONDS) попадают в лог с самыми долгими SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = random.random() < settings.METRICS_SAMPLE_RATE
+        stats = metrics.RequestStats(keep_queries=sampled)
+        metrics.activate(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            metrics.deactivate()
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.observe(view, duration, stats)
+        if sampled and duration >= settings.METRICS_SLOW_SECONDS:
+            self.log_slow(request, view, duration, stats)
+        return response
+
+    def log_slow(self, request, view, duration, stats):
+        queries = ''.join(
+            f'\n  {total * 1000:.1f} мс, {repeats} раз: {sql}'
+            for total, repeats, sql in stats.top_queries(
+                settings.METRICS_TOP_QUERIES
+            )
+        )
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.0f мс, к базе %d за %.0f мс, '
+            'шаблоны %.0f мс.%s',
+            request.method, request.get_full_path(), view, duration * 1000,
+            stats.query_count, stats.db_time * 1000,
+            stats.template_time * 1000, queries,
+        )
+
+
+class NPlusOneMiddleware:
+    """Ищет N+1 в каждом запросе, если задан NPLUSONE_MODE.
+
+    'raise' — вьюха падает с NPlusOneError (так запускаются тесты),
+    'log' — предупреждение в лог (стейджинг). Допустимые повторы
+    перечисляются по вьюхам в NPLUSONE_ALLOWED, для всех вьюх — под '*',
+    а при нарезке превью в запросе — в NPLUSONE_ALLOWED_INLINE_THUMBNAILS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = settings.NPLUSONE_MODE
+        if not mode:
+            return self.get_response(request)
+        with nplusone.Detector() as detector:
+            response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        allowed = settings.NPLUSONE_ALLOWED
+        patterns = [*allowed.get('*', ()), *allowed.get(view, ())]
+        if not settings.THUMBNAIL_WORKERS:
+            patterns += settings.NPLUSONE_ALLOWED_INLINE_THUMBNAILS
+        problems = detector.problems(patterns)
+        if problems:
+            message = nplusone.report(view, problems)
+            if mode == 'raise':
+                raise nplusone.NPlusOneError(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,100 @@
+"""Поиск N+1: одинаковых SELECT, повторяющихся из одного места.
+
+Detector на время запроса подключается ко всем соединениям
+и запоминает для каждого SELECT его форму (SQL без значений,
+списки IN свёрнуты) и место, откуда он пришёл: строку шаблона,
+если запрос вызвал шаблон, или ближайшую строку кода проекта.
+Форма, повторённая из одного места NPLUSONE_THRESHOLD раз и больше, —
+почти всегда ленивая загрузка в цикле: post.author без select_related
+и т.п. Что с этим делать, решает NPlusOneMiddleware: в тестах — падать,
+на стейджинге — писать в лог.
+"""
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+# Собственные обёртки не считаются местом запроса.
+SKIPPED_FILES = tuple(
+    os.path.join(os.path.dirname(__file__), name)
+    for name in (
+        'nplusone.py', 'metrics.py', 'middleware.py', 'template_backends.py'
+    )
+)
+
+
+class NPlusOneError(Exception):
+    """Вьюха делает одинаковые запросы в цикле."""
+
+
+def shape(sql):
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def location():
+    """Строка шаблона или кода проекта, из-за которой пошёл запрос."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            if isinstance(node, Node):
+                return f'{node.origin.name}:{node.token.lineno}'
+        filename = frame.f_code.co_filename
+        if (filename.startswith(settings.BASE_DIR)
+                and 'site-packages' not in filename
+                and not filename.startswith(SKIPPED_FILES)):
+            return (
+                f'{os.path.relpath(filename, settings.BASE_DIR)}:'
+                f'{frame.f_lineno}'
+            )
+        frame = frame.f_back
+    return 'неизвестно'
+
+
+class Detector:
+    """Запоминает SELECT всех соединений, пока открыт with."""
+
+    def __init__(self):
+        self.queries = Counter()
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            self.queries[shape(sql), location()] += 1
+        return execute(sql, params, many, context)
+
+    def problems(self, allowed=(), threshold=None):
+        """Повторы: [(сколько раз, место, форма SQL)].
+
+        allowed — подстроки SQL, повторы которых допустимы.
+        """
+        if threshold is None:
+            threshold = settings.NPLUSONE_THRESHOLD
+        return sorted((
+            (count, where, sql)
+            for (sql, where), count in self.queries.items()
+            if count >= threshold
+            and not any(pattern in sql for pattern in allowed)
+        ), reverse=True)
+
+
+def report(view, problems):
+    return f'N+1 в {view}:' + ''.join(
+        f'\n  {count} раз из {where}: {sql}'
+        for count, where, sql in problems
+    )
@@ -0,0 +1,19 @@
+"""Замена репликации для локальной разработки и тестов.
+
+Копирует основную базу SQLite в реплики через backup API: реплика
+получает точный снимок на момент копирования. Команда
+replicate_sqlite повторяет это с интервалом — так видна задержка
+реплик, которую сглаживает PrimaryPinMiddleware.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .db_router import replicas
+
+
+def replicate(aliases=None):
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    for alias in aliases or replicas():
+        target = connections[alias]
+        target.ensure_connection()
+        source.connection.backup(target.connection)
@@ -0,0 +1,96 @@
+"""Файловое хранилище с адресацией по содержимому.
+
+Имя файла — SHA-256 его содержимого: «posts/ab/cd/abcd….webp». Хеш
+считается, пока файл потоком пишется во временный файл рядом, поэтому
+содержимое читается один раз и целиком в памяти не лежит. Если файл
+с таким хешем уже есть, временный удаляется и возвращается имя
+существующего: сколько бы раз ни загрузили одну картинку, на диске
+она одна, и превью sorl (они именуются по исходному файлу) тоже одни.
+
+Хранилище не знает, кто ссылается на файл, поэтому само ничего
+не удаляет: удаление решают счётчики ссылок, см. posts.models.ImageBlob.
+Сохранение файла и проверка «ссылок нет, удаляем» идут под одной
+блокировкой (lock), а сигнал blob_saved отправляется, пока она взята:
+его получатель успевает записать ссылку раньше, чем удаление её
+проверит, и файл, найденный на диске, не пропадёт из-под новой загрузки.
+"""
+import fcntl
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+from django.dispatch import Signal
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+LOCK_FILE = '.lock'
+
+# Файл name сохранён (или уже был); отправляется под блокировкой.
+blob_saved = Signal(providing_args=['name'])
+
+
+def is_hashed(name):
+    """Лежит ли файл уже под именем-хешем."""
+    return bool(HASHED_NAME.search(name))
+
+
+def hashed_name(name, hexdigest):
+    """Имя в хранилище для файла name с содержимым hexdigest."""
+    return posixpath.join(
+        posixpath.dirname(name), hexdigest[:2], hexdigest[2:4],
+        hexdigest + os.path.splitext(name)[1].lower(),
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Имя задаёт содержимое, одинаковые файлы не переименовываются.
+        return name
+
+    @contextmanager
+    def lock(self, name):
+        """Блокировка файла name между потоками и процессами.
+
+        Одна на каталог с файлами, у которых общие первые 4 знака хеша.
+        """
+        directory = os.path.dirname(self.path(name))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        os.makedirs(self.path(directory), exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=self.path(directory), suffix='.upload'
+        )
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            name = hashed_name(name, digest.hexdigest())
+            path = self.path(name)
+            with self.lock(name):
+                if os.path.exists(path):
+                    os.remove(temp_path)
+                else:
+                    os.replace(temp_path, path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(path, self.file_permissions_mode)
+                blob_saved.send(sender=self.__class__, name=name)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
@@ -0,0 +1,34 @@
+"""Бэкенд шаблонов Django, засекающий время рендеринга для metrics.
+
+Считается только внешний render(): шаблоны, отрендеренные изнутри
+другого шаблона, уже входят в его время.
+"""
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import metrics
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = metrics.current()
+        if stats is None:
+            return super().render(context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
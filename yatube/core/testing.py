@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты падают на N+1 в любой вьюхе, см. core/nplusone.py."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.NPLUSONE_MODE = 'raise'
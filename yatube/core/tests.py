@@ -0,0 +1,351 @@
+import asyncio
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import (Client, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import path, reverse
+
+from core import db_router, loadtest, metrics, nplusone, wsgi_server
+from core.middleware import PIN_COOKIE
+from core.replication import replicate
+from posts.models import AuthorStats, Follow, Group, Post
+
+User = get_user_model()
+
+
+def lazy_authors(request):
+    return HttpResponse(
+        ' '.join(post.author.username for post in Post.objects.all())
+    )
+
+
+# Для NPlusOneTests: вьюха, которая грузит авторов по одному.
+urlpatterns = [path('lazy/', lazy_authors, name='lazy')]
+
+
+def echo_app():
+    """WSGI-приложение для WsgiServerTests: /fail/ падает как вьюха."""
+    def app(environ, start_response):
+        if environ['PATH_INFO'] == '/fail/':
+            try:
+                raise OperationalError('database is locked')
+            except OperationalError:
+                wsgi_server.remember_exception(None)
+            start_response('500 Internal Server Error', [])
+            return [b'']
+        body = environ['wsgi.input'].read()
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [environ['REQUEST_METHOD'].encode(), b' ', body]
+    return app
+
+
+TWO_TIER_OPTIONS = {
+    'STAMP_INTERVAL': 0,
+    'LOCAL_MAX_ENTRIES': 2,
+    'SHARED_ONLY_PREFIXES': ['generation:'],
+}
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-shared',
+    },
+    # Два «процесса» с разными локальными уровнями над общим кешем.
+    'first': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': dict(TWO_TIER_OPTIONS, LOCAL_NAME='first'),
+    },
+    'second': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': dict(TWO_TIER_OPTIONS, LOCAL_NAME='second'),
+    },
+})
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.first = caches['first']
+        self.second = caches['second']
+        self.shared = caches['shared']
+        self.first.clear()
+        self.second.local.clear()
+
+    def test_local_tier_serves_hot_keys(self):
+        """Прочитанный ключ отдаётся из памяти процесса."""
+        self.first.set('key', 'value')
+        self.shared.delete('key')
+        self.assertEqual(self.first.get('key'), 'value')
+
+    def test_write_in_other_process_invalidates_local_tier(self):
+        """Запись в одном процессе сбрасывает локальный уровень другого."""
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+        self.first.set('key', 'new')
+        self.assertEqual(self.second.get('key'), 'new')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_own_write_does_not_hide_other_writes(self):
+        """Своя запись сначала сверяет штамп: чужая запись, сделанная
+        между сверками, не теряется."""
+        self.first.stamp_interval = 60
+        self.addCleanup(setattr, self.first, 'stamp_interval', 0)
+        self.first.set('key', 'old')
+        self.second.set('key', 'new')
+        self.first.set('other', 'value')
+        self.assertEqual(self.first.get('key'), 'new')
+
+    def test_shared_only_keys_skip_local_tier(self):
+        """Метки поколений всегда читаются из общего уровня."""
+        self.first.set('generation:global', 'a')
+        self.shared.set('generation:global', 'b')
+        self.assertEqual(self.first.get('generation:global'), 'b')
+        self.assertEqual(
+            self.second.get_many(['generation:global']),
+            {'generation:global': 'b'},
+        )
+
+    def test_local_tier_is_bounded(self):
+        """Локальный уровень вытесняет давно не читанные ключи."""
+        for key in ('a', 'b', 'c'):
+            self.first.add(key, key)
+        self.assertEqual(len(self.first.local.entries), 2)
+        self.shared.delete('a')
+        self.assertIsNone(self.first.get('a'))
+
+
+class SqliteTuningTests(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            # 1 — NORMAL.
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_benchmark_compares_modes(self):
+        """Бенчмарк печатает строку на режим без и с настройкой."""
+        out = StringIO()
+        call_command(
+            'benchmark_sqlite', workers=2, duration=0.2, rows=100,
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[1:]],
+                         ['default', 'tuned'])
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRouterTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        replicate()
+
+    def test_reads_from_replica_until_replicated(self):
+        """Чтение идёт с реплики, запись — в основную базу."""
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.assertFalse(Post.objects.exists())
+        with db_router.use_primary():
+            self.assertTrue(Post.objects.exists())
+        replicate()
+        self.assertTrue(Post.objects.exists())
+
+    def test_session_pinned_after_write(self):
+        """После записи сессия получает метку чтения из основной базы."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('posts:index'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response = client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response = client.get(reverse('posts:profile', kwargs={
+            'username': self.user.username}))
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_fresh_pages_built_from_primary(self):
+        """Страница сразу после смены ленты не берётся с отстающей
+        реплики, иначе устаревшая копия попала бы в кеш."""
+        Post.objects.create(author=self.user, text='Новый пост')
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def test_metrics_endpoint(self):
+        """Метрики вьюх и кеша отдаются в формате Prometheus."""
+        for _ in range(2):
+            self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        view = '{view="posts:index"}'
+        for line in (
+            f'yatube_request_duration_seconds_count{view} 2',
+            f'yatube_db_queries_count{view} 2',
+            f'yatube_template_duration_seconds_count{view} 2',
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2',
+            'yatube_cache_requests_total'
+            '{view="posts:index",cache="page",result="hit"} 1',
+            'yatube_cache_requests_total'
+            '{view="posts:index",cache="page",result="miss"} 1',
+            'yatube_cache_requests_total'
+            '{view="posts:index",cache="cards",result="miss"} 1',
+        ):
+            self.assertIn(line, text)
+
+    def test_metrics_only_for_internal_ips(self):
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='10.0.0.1'
+        )
+        self.assertEqual(response.status_code, 404)
+        # Через прокси адрес ничего не значит.
+        response = self.client.get(
+            reverse('metrics'), HTTP_X_FORWARDED_FOR='203.0.113.5'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        """С токеном адрес не важен, без него — не пускает."""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.get(
+            url, REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_SAMPLE_RATE=1, METRICS_SLOW_SECONDS=0)
+    def test_slow_request_logged_with_queries(self):
+        """Медленный запрос пишется в лог вместе с его SQL."""
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class NPlusOneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            user = User.objects.create_user(username=f'user{i}')
+            Post.objects.create(author=user, text='Пост')
+
+    def test_lazy_loads_in_code(self):
+        """Повторы находятся, место — строка кода проекта."""
+        with nplusone.Detector() as detector:
+            [post.author for post in Post.objects.all()]
+        [(count, where, sql)] = detector.problems()
+        self.assertEqual(count, 3)
+        self.assertTrue(where.startswith('core/tests.py:'))
+        self.assertIn('"auth_user"', sql)
+        with nplusone.Detector() as detector:
+            [post.author for post in Post.objects.select_related('author')]
+        self.assertEqual(detector.problems(), [])
+
+    def test_lazy_loads_in_template(self):
+        """Если запрос вызвал шаблон, указывается строка шаблона."""
+        template = Template(
+            '{% for post in posts %}\n{{ post.author }}\n{% endfor %}'
+        )
+        with nplusone.Detector() as detector:
+            template.render(Context({'posts': Post.objects.all()}))
+        [(count, where, sql)] = detector.problems()
+        self.assertTrue(where.endswith(':2'))
+
+    @override_settings(ROOT_URLCONF='core.tests')
+    def test_middleware_modes_and_allowlist(self):
+        with self.assertRaises(nplusone.NPlusOneError):
+            self.client.get('/lazy/')
+        with override_settings(NPLUSONE_MODE='log'):
+            with self.assertLogs('core.middleware', 'WARNING') as logs:
+                self.client.get('/lazy/')
+        self.assertIn('N+1 в lazy', logs.output[0])
+        with override_settings(NPLUSONE_ALLOWED={'lazy': ['"auth_user"']}):
+            self.assertEqual(self.client.get('/lazy/').status_code, 200)
+
+    @override_settings(ROOT_URLCONF='core.tests',
+                       NPLUSONE_ALLOWED_INLINE_THUMBNAILS=['"auth_user"'])
+    def test_inline_thumbnail_allowance(self):
+        """Повторы нарезки превью допустимы, только если превью режутся
+        в запросе."""
+        with override_settings(THUMBNAIL_WORKERS=2):
+            with self.assertRaises(nplusone.NPlusOneError):
+                self.client.get('/lazy/')
+        with override_settings(THUMBNAIL_WORKERS=0):
+            self.assertEqual(self.client.get('/lazy/').status_code, 200)
+
+
+class WsgiServerTests(SimpleTestCase):
+    def setUp(self):
+        self.address, self.processes = wsgi_server.start(echo_app, 1)
+        self.addCleanup(wsgi_server.stop, self.processes)
+
+    def test_keep_alive_and_errors(self):
+        """Запросы идут по одному соединению, ошибка вьюхи видна
+        в заголовке."""
+        async def requests():
+            client = loadtest.Connection(*self.address)
+            first = await client.request('POST', '/', {}, b'text')
+            writer = client.writer
+            second = await client.request('GET', '/fail/', {})
+            self.assertIs(client.writer, writer)
+            client.close()
+            return first, second
+
+        (status, _), (failed, headers) = asyncio.run(requests())
+        self.assertEqual(status, 200)
+        self.assertEqual(failed, 500)
+        self.assertEqual(
+            headers[wsgi_server.ERROR_HEADER.lower()],
+            'OperationalError: database is locked',
+        )
+
+    def test_results_summary(self):
+        results = loadtest.Results()
+        for latency in (0.01, 0.02, 0.03, 0.04):
+            results.add('index', latency)
+        results.add('add_comment', 0.1, 'HTTP 403')
+        report = results.summary(duration=2)
+        self.assertEqual(report['index']['p50_ms'], 20)
+        self.assertEqual(report['index']['rps'], 2)
+        self.assertEqual(report['add_comment']['errors'], {'HTTP 403': 1})
+        self.assertEqual(report['total']['requests'], 5)
+        self.assertEqual(report['total']['error_rate'], 0.2)
+
+
+class LoadTestTargetsTests(TestCase):
+    def test_authors_without_stats(self):
+        """Без пересчитанных счётчиков авторы берутся из постов."""
+        author = User.objects.create_user(username='auth')
+        reader = User.objects.create_user(username='reader')
+        Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(author=author, text='Пост')
+        Follow.objects.create(user=reader, author=author)
+        AuthorStats.objects.all().delete()
+        self.assertEqual(loadtest.Targets().authors, ['auth'])
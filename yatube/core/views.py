@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -7,3 +13,29 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics_allowed(request):
+    """Токен из METRICS_TOKEN, если он задан, иначе внутренний адрес.
+
+    За обратным прокси REMOTE_ADDR — адрес прокси, поэтому запрос
+    с X-Forwarded-For по адресу не пускается: там нужен токен.
+    """
+    if settings.METRICS_TOKEN:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return hmac.compare_digest(
+            header.encode(), f'Bearer {settings.METRICS_TOKEN}'.encode()
+        )
+    return (
+        'HTTP_X_FORWARDED_FOR' not in request.META
+        and request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    )
+
+
+def prometheus_metrics(request):
+    """Метрики процесса для Prometheus; доступны только изнутри."""
+    if not metrics_allowed(request):
+        raise Http404
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4'
+    )
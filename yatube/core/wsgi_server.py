@@ -0,0 +1,141 @@
+"""Многопроцессный WSGI-сервер с keep-alive для нагрузочных тестов.
+
+Только стандартная библиотека: сокет открывается в родителе, воркеры
+(fork) принимают соединения с общего сокета, как gunicorn с sync-
+воркерами, а каждое соединение обслуживает свой поток. Ответ
+собирается целиком и уходит с Content-Length, поэтому соединение
+HTTP/1.1 переживает запрос. Необработанное исключение вьюхи
+возвращается клиенту в заголовке X-Load-Error, чтобы генератор
+нагрузки мог отличить, например, «database is locked» от других 500.
+"""
+import io
+import multiprocessing
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote
+
+ERROR_HEADER = 'X-Load-Error'
+
+_errors = threading.local()
+
+
+def remember_exception(sender, **kwargs):
+    # got_request_exception отправляется внутри except.
+    error = sys.exc_info()[1]
+    if error is not None:
+        _errors.last = f'{type(error).__name__}: {error}'[:200]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.run_app()
+
+    do_POST = do_HEAD = do_PUT = do_DELETE = do_GET
+
+    def environ(self, body):
+        path, _, query = self.path.partition('?')
+        host, port = self.server.server_address[:2]
+        environ = {
+            'REQUEST_METHOD': self.command,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote(path, 'iso-8859-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': host,
+            'SERVER_PORT': str(port),
+            'SERVER_PROTOCOL': self.request_version,
+            'REMOTE_ADDR': self.client_address[0],
+            'CONTENT_TYPE': self.headers.get('Content-Type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in self.headers.items():
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            if key in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+                continue
+            environ[key] = (
+                f'{environ[key]},{value}' if key in environ else value
+            )
+        return environ
+
+    def run_app(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        started = []
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+            return chunks.append
+
+        _errors.last = None
+        result = self.server.app(self.environ(body), start_response)
+        try:
+            chunks.extend(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        content = b''.join(chunks)
+        status, headers = started
+        code, _, reason = status.partition(' ')
+        self.send_response(int(code), reason)
+        for name, value in headers:
+            if name.lower() != 'content-length':
+                self.send_header(name, value)
+        if _errors.last:
+            self.send_header(ERROR_HEADER, _errors.last)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+def _serve(server, load_app):
+    server.app = load_app()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def start(load_app, workers, host='127.0.0.1', port=0):
+    """Запускает воркеры; возвращает (адрес, процессы).
+
+    load_app() вызывается в каждом воркере после fork: соединения
+    с базой и прочее состояние у воркеров не общие.
+    """
+    server = Server((host, port), Handler)
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=_serve, args=(server, load_app), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    # Родитель соединения не принимает.
+    server.socket.close()
+    return server.server_address, processes
+
+
+def stop(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
@@ -1,9 +1,19 @@
 from django.contrib import admin
 
+from .forms import PostForm
 from .models import Post,Group
+from .search import filter_posts
+
+
+class PostAdminForm(PostForm):
+    # Картинки из админки проходят ту же обработку, что и с сайта,
+    # но автора, как и раньше, можно выбрать.
+    class Meta(PostForm.Meta):
+        fields = '__all__'
 
 
 class PostAdmin(admin.ModelAdmin):
+    form = PostAdminForm
     list_display = (
         'pk',
         'text',
@@ -16,6 +26,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тому же индексу, что и на сайте, а не LIKE '%q%'.
+        if not search_term:
+            return queryset, False
+        return filter_posts(queryset, search_term), False
+
 # При регистрации модели Post источником конфигурации для неё назначаем
 # класс PostAdmin
 admin.site.register(Post, PostAdmin)
@@ -0,0 +1,27 @@
+"""Помощники массовой записи для команд seed_posts и import_data."""
+from contextlib import contextmanager
+
+
+@contextmanager
+def explicit_pub_date(*models):
+    """Отключает auto_now_add, чтобы pub_date бралась из объектов."""
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def batches(objects, batch_size):
+    """Разбивает поток объектов на списки по batch_size."""
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,286 @@
+"""Кеш страниц с инвалидацией по поколениям.
+
+У каждой ленты есть «поколение» — случайная метка в кеше:
+общая лента ('global',), группа ('group', slug), автор ('author', username),
+пост ('post', id) и лента подписок читателя ('follower', user_id).
+Посты популярного автора (см. posts.timeline) меняют не метки всех его
+подписчиков, а одну ('famous', author_id), которая входит в ключ ленты
+подписок каждого из них.
+Ключ закешированной страницы включает метки всех её лент, поэтому
+страница живёт, пока данные не изменились, а сигналы Post, Comment,
+Follow, Group и User просто выдают лентам новые метки — старые записи
+становятся недостижимыми и вытесняются сами.
+
+Те же метки дают валидаторы условного GET: ETag — хеш ключа страницы,
+Last-Modified — время последней смены метки (с него метка начинается).
+Поэтому 304 отдаётся до основных запросов и рендеринга.
+"""
+import time
+from functools import wraps
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from core import db_router, metrics
+
+from .models import AuthorStats, Follow, Group, Post
+
+User = get_user_model()
+
+GLOBAL = ('global',)
+
+
+def generation_key(scope):
+    return 'generation:' + ':'.join(str(part) for part in scope)
+
+
+def new_generation():
+    return f'{int(time.time())}.{uuid4().hex}'
+
+
+def generation_time(generation):
+    """Время выдачи метки или None для меток старого формата."""
+    try:
+        return int(generation.split('.', 1)[0])
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_generations(scopes):
+    """Текущие метки поколений; недостающие создаются."""
+    keys = [generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, new_generation(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump_generations(scopes):
+    """Выдаёт лентам новые метки, обесценивая их страницы в кеше."""
+    cache.set_many(
+        {generation_key(scope): new_generation() for scope in scopes}, None
+    )
+
+
+def scopes_for_post(post, group_ids=()):
+    """Ленты, в которых виден пост; group_ids — прежние группы поста."""
+    scopes = [GLOBAL, ('post', post.pk)]
+    group_ids = {post.group_id, *group_ids} - {None}
+    scopes += [
+        ('group', slug) for slug in Group.objects.filter(
+            pk__in=group_ids
+        ).values_list('slug', flat=True)
+    ]
+    scopes += [
+        ('author', username) for username in User.objects.filter(
+            pk=post.author_id
+        ).values_list('username', flat=True)
+    ]
+    scopes += follower_scopes([post.author_id])
+    return scopes
+
+
+def follower_scopes(author_ids):
+    """Метки лент подписок, в которых видны посты авторов."""
+    author_ids = set(author_ids)
+    # Популярных авторов мало, их список целиком короче списка ids.
+    famous = set(AuthorStats.objects.filter(
+        followers__gte=settings.TIMELINE_FANOUT_LIMIT
+    ).values_list('user_id', flat=True)) & author_ids
+    scopes = [('famous', author_id) for author_id in famous]
+    scopes += [
+        ('follower', user_id) for user_id in set(
+            _column(Follow, 'author_id', author_ids - famous, 'user_id')
+        )
+    ]
+    return scopes
+
+
+def _column(model, lookup, ids, column):
+    # По частям: у SQLite ограничено число параметров запроса.
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        yield from model.objects.filter(
+            **{f'{lookup}__in': ids[start:start + 500]}
+        ).values_list(column, flat=True)
+
+
+def scopes_for_bulk(author_ids=(), group_ids=(), post_ids=()):
+    """Ленты, задетые массовой записью постов в обход сигналов."""
+    scopes = [GLOBAL]
+    scopes += [('post', post_id) for post_id in post_ids]
+    scopes += [
+        ('group', slug) for slug in _column(Group, 'pk', group_ids, 'slug')
+    ]
+    scopes += [
+        ('author', username)
+        for username in _column(User, 'pk', author_ids, 'username')
+    ]
+    scopes += follower_scopes(author_ids)
+    return scopes
+
+
+def scopes_for_follow(follow):
+    return [('follower', follow.user_id)] + [
+        ('author', username) for username in User.objects.filter(
+            pk__in=(follow.author_id, follow.user_id)
+        ).values_list('username', flat=True)
+    ]
+
+
+def index_page_scopes(request):
+    return [GLOBAL]
+
+
+def group_page_scopes(request, slug):
+    return [('group', slug)]
+
+
+def profile_page_scopes(request, username):
+    return [('author', username)]
+
+
+def post_page_scopes(request, post_id):
+    # Счётчик постов автора на странице зависит от ленты автора.
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True
+    ).first()
+    if username is None:
+        return None
+    return [('post', post_id), ('author', username)]
+
+
+def comments_page_scopes(request, post_id):
+    return [('post', post_id)]
+
+
+def follow_page_scopes(request):
+    famous = Follow.objects.filter(
+        user_id=request.user.pk,
+        author__stats__followers__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True)
+    return [('follower', request.user.pk)] + [
+        ('famous', author_id) for author_id in famous
+    ]
+
+
+def page_key(prefix, request, generations):
+    viewer = request.user.pk or 'anon'
+    path = md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{prefix}:{viewer}:{path}:' + ':'.join(generations)
+
+
+def last_modified(request, generations):
+    """Last-Modified страницы; только для анонимов и не раньше, чем
+    через секунду после смены лент.
+
+    После входа или выхода даты лент не меняются, а страница — да,
+    поэтому у пользователей страница сверяется только по ETag,
+    в который входит id зрителя.
+    """
+    if request.user.is_authenticated:
+        return None
+    times = [generation_time(generation) for generation in generations]
+    if None in times:
+        return None
+    # Время меток — с точностью до секунды. Пока секунда последней
+    # смены не прошла, страница может измениться ещё раз с той же
+    # датой, и If-Modified-Since дал бы устаревший 304: до конца
+    # секунды страница сверяется только по ETag.
+    if max(times) >= int(time.time()):
+        return None
+    return max(times)
+
+
+def replicas_may_lag(generations):
+    """Ленты менялись так недавно, что реплики могли не догнать.
+
+    Страницу тогда нужно собирать из основной базы: иначе устаревшая
+    копия ляжет в кеш под новыми метками и проживёт до следующей смены.
+    """
+    if not db_router.replicas():
+        return False
+    times = [generation_time(generation) for generation in generations]
+    if None in times:
+        return True
+    return time.time() - max(times) < settings.REPLICA_PIN_SECONDS + 1
+
+
+def set_validators(request, response, etag, modified):
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    # Браузер и CDN каждый раз сверяют страницу; чужую
+    # персональную страницу общий кеш не отдаст.
+    patch_cache_control(
+        response, no_cache=True, private=request.user.is_authenticated
+    )
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def cache_by_generation(prefix, scopes):
+    """Кеширует GET-ответы вьюхи до смены поколения её лент.
+
+    scopes(request, *args, **kwargs) возвращает ленты страницы
+    или None, если страницу кешировать не нужно. Ключ зависит от
+    пользователя: кнопки подписки и шапка у всех разные.
+    Ответы получают ETag и Last-Modified, а условный GET
+    с актуальными валидаторами сразу получает 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            page_scopes = None
+            if request.method == 'GET':
+                page_scopes = scopes(request, *args, **kwargs)
+            if page_scopes is None:
+                return view(request, *args, **kwargs)
+            generations = get_generations(page_scopes)
+            key = page_key(prefix, request, generations)
+            etag = quote_etag(md5(key.encode()).hexdigest())
+            modified = last_modified(request, generations)
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=modified
+            )
+            if not_modified is not None:
+                metrics.count_cache('page', hits=1)
+                return set_validators(request, not_modified, etag, modified)
+            cached = cache.get(key)
+            metrics.count_cache(
+                'page', hits=cached is not None, misses=cached is None
+            )
+            if cached is not None:
+                content, content_type = cached
+                return set_validators(
+                    request,
+                    HttpResponse(content, content_type=content_type),
+                    etag, modified,
+                )
+            with db_router.use_primary(replicas_may_lag(generations)):
+                response = view(request, *args, **kwargs)
+            # Страницы с CSRF-токеном и новыми cookie привязаны к сессии.
+            if (response.status_code == 200
+                    and not request.META.get('CSRF_COOKIE_USED')
+                    and not response.cookies):
+                # Под ключом с метками поколений значение не меняется,
+                # поэтому add: локальные уровни кеша не сбрасываются.
+                cache.add(
+                    key,
+                    (response.content, response['Content-Type']),
+                    settings.PAGE_CACHE_TIMEOUT,
+                )
+            if response.status_code == 200:
+                set_validators(request, response, etag, modified)
+            return response
+        return wrapper
+    return decorator
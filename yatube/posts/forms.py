@@ -1,4 +1,8 @@
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
+
+from . import images
 from .models import Post, Comment
 
 
@@ -7,6 +11,29 @@ class PostForm(ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """Новая картинка заменяется обработанной копией."""
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            return images.process(image)
+        except images.InvalidImage as error:
+            raise ValidationError(str(error))
+
+    def save(self, commit=True):
+        post = super().save(commit=False)
+        image = self.cleaned_data.get('image')
+        if isinstance(image, images.ProcessedImage):
+            post.image_width, post.image_height = image.width, image.height
+            post.image_placeholder = image.placeholder
+        elif not image:
+            post.image_width = post.image_height = None
+            post.image_placeholder = ''
+        if commit:
+            post.save()
+        return post
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,81 @@
+"""Кеш отрендеренных карточек постов.
+
+Карточка кешируется по id поста и его поколению из caching: правка
+поста (post_edit) и смена имени автора (в карточке его имя и ссылка
+на профиль, см. posts.signals) выдают посту новую метку, и старая
+карточка больше не находится. Страница ленты забирает все свои
+карточки одним get_many.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from core import metrics
+
+from .caching import get_generations
+from .thumbnails import PageThumbnails
+
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+HITS_KEY = 'cards:hits'
+MISSES_KEY = 'cards:misses'
+
+
+def _count(key, delta):
+    if not delta:
+        return
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+def card_key(post, version, template_name):
+    return f'card:{template_name}:{post.pk}:{version}'
+
+
+def render_cards(posts, template_name=CARD_TEMPLATE, thumbnails=None):
+    """HTML карточек постов: {id поста: html}.
+
+    thumbnails — PageThumbnails страницы; без него превью для
+    недостающих карточек ищутся одним запросом на всю пачку.
+    """
+    posts = list(posts)
+    if thumbnails is None:
+        thumbnails = PageThumbnails(posts)
+    versions = get_generations([('post', post.pk) for post in posts])
+    keys = {
+        post.pk: card_key(post, version, template_name)
+        for post, version in zip(posts, versions)
+    }
+    cards = {}
+    found = cache.get_many(keys.values())
+    missing = {}
+    for post in posts:
+        html = found.get(keys[post.pk])
+        if html is None:
+            html = render_to_string(
+                template_name, {'post': post, 'thumbnails': thumbnails}
+            )
+            missing[keys[post.pk]] = html
+        cards[post.pk] = html
+    for key, html in missing.items():
+        cache.add(key, html, settings.POST_CARD_CACHE_TIMEOUT)
+    _count(HITS_KEY, len(posts) - len(missing))
+    _count(MISSES_KEY, len(missing))
+    metrics.count_cache(
+        'cards', hits=len(posts) - len(missing), misses=len(missing)
+    )
+    return cards
+
+
+def card_stats():
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = stats.get(HITS_KEY, 0)
+    misses = stats.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
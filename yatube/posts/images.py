@@ -0,0 +1,157 @@
+"""Обработка картинок постов при загрузке.
+
+Оригинал с телефона весит мегабайты, и sorl разбирал бы его заново
+при каждой холодной нарезке превью. Поэтому PostForm сохраняет не
+присланный файл, а его копию: повёрнутую по EXIF, уменьшенную до
+POST_IMAGE_MAX_SIDE по большей стороне и пережатую в POST_IMAGE_FORMAT.
+Метаданные (EXIF, GPS) в копию не попадают. Размеры копии пишутся
+в Post.image_width и Post.image_height — шаблонам не нужно открывать
+файл, чтобы их узнать, а в Post.image_placeholder — заглушка: копия
+размером PLACEHOLDER_SIZE в data: URI, которую страница показывает,
+пока грузится превью.
+
+Размеры картинки известны из заголовка ещё до декодирования: слишком
+большие по числу пикселей отвергаются сразу, а JPEG декодируется
+сразу в уменьшенном масштабе (draft), так что память и время на
+разбор ограничены.
+
+Файлы лежат в хранилище по содержимому (core.storage): одинаковые
+картинки разных постов — один файл с одним набором превью. Сколько
+постов на него ссылается, считает ImageBlob; файл удаляется, когда
+уходит последняя ссылка.
+"""
+import base64
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .models import ImageBlob, Post
+
+FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+# Пропорции карточки 960x339; сотня байт в base64.
+PLACEHOLDER_SIZE = (16, 6)
+
+
+class InvalidImage(ValueError):
+    """Файл не картинка или её нельзя обработать в пределах бюджета."""
+
+
+class ProcessedImage(ContentFile):
+    """Обработанная картинка с размерами для полей модели."""
+
+    def __init__(self, content, name, width, height, placeholder=''):
+        super().__init__(content, name)
+        self.width = width
+        self.height = height
+        self.placeholder = placeholder
+
+
+def _open(upload):
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise InvalidImage('Файл не похож на картинку.')
+    if image.format not in FORMATS:
+        raise InvalidImage(
+            'Поддерживаются только ' + ', '.join(FORMATS) + '.'
+        )
+    if image.width * image.height > settings.POST_IMAGE_MAX_PIXELS:
+        raise InvalidImage(
+            f'Картинка {image.width}×{image.height} слишком большая.'
+        )
+    return image
+
+
+def _decode(image):
+    """Пиксели картинки, повёрнутые по EXIF и уменьшенные."""
+    side = settings.POST_IMAGE_MAX_SIDE
+    # JPEG сразу декодируется в уменьшенном в 2–8 раз виде.
+    image.draft('RGB', (side, side))
+    try:
+        image = ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError, ValueError):
+        raise InvalidImage('Картинка повреждена.')
+    image.thumbnail((side, side), Image.LANCZOS)
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    if settings.POST_IMAGE_FORMAT == 'JPEG':
+        has_alpha = False
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def placeholder(image):
+    """Заглушка картинки: data: URI её кадра карточки в PLACEHOLDER_SIZE."""
+    small = ImageOps.fit(image.convert('RGB'), PLACEHOLDER_SIZE,
+                         Image.BILINEAR)
+    content = BytesIO()
+    small.save(content, 'WEBP', quality=40)
+    return 'data:image/webp;base64,' + base64.b64encode(
+        content.getvalue()
+    ).decode('ascii')
+
+
+def process(upload):
+    """ProcessedImage из загруженного файла; InvalidImage, если нельзя."""
+    image = _decode(_open(upload))
+    image_format = settings.POST_IMAGE_FORMAT
+    content = BytesIO()
+    # exif не передаётся: метаданные оригинала не сохраняются.
+    image.save(
+        content, image_format, quality=settings.POST_IMAGE_QUALITY,
+        optimize=True,
+    )
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return ProcessedImage(
+        content.getvalue(), stem + EXTENSIONS[image_format],
+        image.width, image.height, placeholder(image),
+    )
+
+
+def dimensions(file):
+    """(ширина, высота) сохранённой картинки по её заголовку."""
+    file.open('rb')
+    try:
+        with Image.open(file) as image:
+            return image.width, image.height
+    finally:
+        file.close()
+
+
+def acquire(name):
+    """Пост начал ссылаться на файл name.
+
+    Свежие загрузки сюда не попадают: ссылку на них записывает
+    получатель core.storage.blob_saved, пока хранилище держит блокировку.
+    """
+    if name:
+        ImageBlob.objects.acquire(name)
+
+
+def release(name):
+    """Пост больше не ссылается на name; файл без ссылок удаляется
+    вместе с превью после коммита транзакции."""
+    if name and ImageBlob.objects.release(name):
+        transaction.on_commit(lambda: delete(name))
+
+
+def delete(name):
+    """Удаляет файл и его превью, если на него снова никто не ссылается.
+
+    Проверка и удаление — под блокировкой хранилища: загрузка тех же
+    байтов либо уже записала ссылку, либо дождётся удаления и положит
+    файл заново.
+    """
+    storage = Post._meta.get_field('image').storage
+    with storage.lock(name):
+        if ImageBlob.objects.filter(name=name).exists():
+            return
+        delete_thumbnails(ImageFile(name, storage))
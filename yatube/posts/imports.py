@@ -0,0 +1,201 @@
+"""Потоковая загрузка пользователей, групп и постов из NDJSON и CSV.
+
+Формат строк совпадает с выгрузкой posts.export: автор — username,
+группа — slug. Строки читаются по одной и пишутся bulk_create пачками,
+каждая пачка — в своей транзакции. Авторы и группы ищутся по словарям
+в памяти, которые загружаются одним запросом на всю загрузку.
+Сигналы при bulk_create не срабатывают, поэтому счётчики, ленты,
+поиск и кеш страниц обновляются один раз в конце, см. refresh().
+"""
+import csv
+import gzip
+import io
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching
+from .bulk import batches, explicit_pub_date
+from .models import Group, ImageBlob, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 10000
+FORMATS = ('ndjson', 'csv')
+
+
+class Result:
+    """Итог загрузки: сколько строк записано, пропущено и отвергнуто,
+    чьи ленты затронуты.
+
+    written — сколько строк отправлено в базу, inserted — сколько она
+    действительно вставила: ignore_conflicts молча пропускает дубли.
+    """
+
+    def __init__(self):
+        self.written = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.errors = []
+        self.author_ids = set()
+        self.group_ids = set()
+
+    def reject(self, number, error):
+        if isinstance(error, KeyError):
+            error = f'нет поля {error}'
+        self.errors.append(f'строка {number}: {error}')
+
+
+class InvalidRow(ValueError):
+    """Строку файла не удалось разобрать."""
+
+
+def open_source(path):
+    """Текстовый поток файла; '-' — stdin, '.gz' распаковывается."""
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_rows(source, import_format):
+    """Словари строк из открытого текстового потока.
+
+    Вместо строки, которая не разбирается, отдаётся InvalidRow:
+    одна битая строка не должна обрывать загрузку.
+    """
+    if import_format == 'csv':
+        yield from csv.DictReader(source)
+        return
+    for line in source:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                yield InvalidRow(f'не JSON: {error}')
+
+
+def required(row, name):
+    value = row.get(name)
+    if value is None or value == '':
+        raise KeyError(name)
+    return value
+
+
+def build(rows, result, make):
+    """Объекты make(row); строки с ошибками пропускаются в result."""
+    for number, row in enumerate(rows, 1):
+        try:
+            if isinstance(row, InvalidRow):
+                raise row
+            obj = make(row)
+        except (KeyError, ValueError, TypeError, AttributeError) as error:
+            result.reject(number, error)
+            continue
+        if obj is not None:
+            yield obj
+
+
+def bulk(model, objects, batch_size, result):
+    """Пишет объекты пачками; уже существующие строки пропускает база."""
+    before = model.objects.count()
+    for batch in batches(objects, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+        result.written += len(batch)
+    result.inserted = model.objects.count() - before
+    return result
+
+
+def import_users(rows, batch_size=BATCH_SIZE):
+    # Пароль нельзя перенести: пользователи восстановят его по почте.
+    password = make_password(None)
+    result = Result()
+
+    def user(row):
+        return User(
+            username=required(row, 'username'),
+            first_name=row.get('first_name') or '',
+            last_name=row.get('last_name') or '',
+            email=row.get('email') or '',
+            password=password,
+        )
+
+    return bulk(User, build(rows, result, user), batch_size, result)
+
+
+def import_groups(rows, batch_size=BATCH_SIZE):
+    result = Result()
+
+    def group(row):
+        return Group(
+            title=required(row, 'title'),
+            slug=required(row, 'slug'),
+            description=row.get('description') or '',
+        )
+
+    return bulk(Group, build(rows, result, group), batch_size, result)
+
+
+def parse_pub_date(value, default):
+    if not value:
+        return default
+    pub_date = parse_datetime(value)
+    if pub_date is None:
+        raise ValueError(f'не разобрать дату {value!r}')
+    return pub_date
+
+
+def import_posts(rows, batch_size=BATCH_SIZE):
+    """Посты с неизвестным автором или группой пропускаются."""
+    authors = dict(User.objects.values_list('username', 'id'))
+    groups = dict(Group.objects.values_list('slug', 'id'))
+    now = timezone.now()
+    result = Result()
+
+    def post(row):
+        author_id = authors.get(row.get('author'))
+        slug = row.get('group') or None
+        group_id = groups.get(slug)
+        if author_id is None or (slug and group_id is None):
+            result.skipped += 1
+            return None
+        post = Post(
+            author_id=author_id,
+            group_id=group_id,
+            text=required(row, 'text'),
+            image=row.get('image') or '',
+            pub_date=parse_pub_date(row.get('pub_date'), now),
+        )
+        result.author_ids.add(author_id)
+        if group_id is not None:
+            result.group_ids.add(group_id)
+        return post
+
+    with explicit_pub_date(Post):
+        return bulk(Post, build(rows, result, post), batch_size, result)
+
+
+IMPORTERS = {
+    'users': import_users,
+    'groups': import_groups,
+    'posts': import_posts,
+}
+
+
+def refresh(result, stdout=None):
+    """Пересчитывает денормализованные данные после загрузки постов."""
+    for command in ('rebuild_author_stats', 'rebuild_timelines',
+                    'rebuild_search_index'):
+        call_command(command, stdout=stdout)
+    ImageBlob.objects.rebuild()
+    caching.bump_generations(
+        caching.scopes_for_bulk(result.author_ids, result.group_ids)
+    )
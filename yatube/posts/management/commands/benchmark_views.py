@@ -0,0 +1,288 @@
+import json
+import math
+import platform
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.metrics import RequestStats
+from posts.models import AuthorStats, Comment, Post
+from posts.paginator import NEXT, POSTS_PER_PAGE, encode_cursor
+
+PERCENTILES = (50, 95, 99)
+# Что сравнивается с базовым прогоном. Хвосты из пары десятков
+# замеров шумят сильнее любой регрессии, они только печатаются.
+COMPARED = ('p50_ms', 'queries', 'peak_kb')
+# Рост задержки меньше этого не регрессия, а шум.
+MIN_DELTA_MS = 2.0
+# Тексты записей из замеров: по ним они удаляются после прогона.
+COMMENT_TEXT = 'Комментарий из бенчмарка'
+POST_TEXT = 'Пост из бенчмарка'
+
+
+def percentile(values, p):
+    """Значение, не меньше которого p процентов замеров (nearest rank)."""
+    values = sorted(values)
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+def deep_cursor(queryset, depth):
+    """Курсор страницы номер depth ленты или самой дальней из имеющихся."""
+    rows = queryset.values('pub_date', 'id')
+    offset = depth * POSTS_PER_PAGE - 1
+    row = next(iter(rows[offset:offset + 1]), None) or rows.last()
+    return row and encode_cursor(NEXT, row)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку (перцентили), число запросов и пик памяти вьюх '
+        'posts на первых и глубоких страницах. Данные — из seed_posts '
+        '--scale; результаты пишутся в JSON и сравниваются с базовыми.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=20,
+            help='Сколько раз запрашивать каждую страницу.',
+        )
+        parser.add_argument(
+            '--depth', type=int, default=100,
+            help='Номер «глубокой» страницы лент.',
+        )
+        parser.add_argument(
+            '--cached', action='store_true',
+            help='Не чистить кеш между запросами.',
+        )
+        parser.add_argument('--output', help='Куда записать JSON.')
+        parser.add_argument(
+            '--compare', metavar='BASELINE',
+            help='JSON прошлого прогона: ухудшения считаются регрессиями.',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Допустимый рост задержки и памяти, доля (0.25 = 25%%).',
+        )
+
+    def targets(self):
+        """Самые тяжёлые страницы: популярные группа, автор и пост,
+        читатель с наибольшим числом подписок."""
+        author_stats = AuthorStats.objects.order_by('-posts').first()
+        reader_stats = AuthorStats.objects.order_by('-following').first()
+        group = Post.objects.filter(group__isnull=False).values(
+            'group__slug', 'group_id'
+        ).annotate(count=Count('id')).order_by('-count').first()
+        if author_stats is None or group is None:
+            raise CommandError(
+                'Нет данных: сначала запустите seed_posts --scale 10k.'
+            )
+        commented = Comment.objects.values('post_id').annotate(
+            count=Count('id')
+        ).order_by('-count').first()
+        post_id = commented['post_id'] if commented else (
+            Post.objects.order_by('-pub_date').values_list('id', flat=True)[0]
+        )
+        oldest_id = Post.objects.order_by('pub_date').values_list(
+            'id', flat=True
+        )[0]
+        return (
+            author_stats.user, reader_stats.user, group, post_id, oldest_id
+        )
+
+    def cases(self, depth):
+        """(имя, метод, url, данные) для каждого замера."""
+        author, reader, group, post_id, oldest_id = self.targets()
+        feeds = (
+            ('index', reverse('posts:index'), Post.objects.feed()),
+            (
+                'group_posts',
+                reverse('posts:group_posts',
+                        kwargs={'slug': group['group__slug']}),
+                Post.objects.feed().filter(group_id=group['group_id']),
+            ),
+            (
+                'profile',
+                reverse('posts:profile',
+                        kwargs={'username': author.username}),
+                Post.objects.feed().filter(author=author),
+            ),
+            (
+                'follow_index', reverse('posts:follow_index'),
+                Post.objects.feed().filter(author__following__user=reader),
+            ),
+        )
+        cases = []
+        for name, url, queryset in feeds:
+            cases.append((f'{name}/shallow', 'get', url, None))
+            cursor = deep_cursor(queryset, depth)
+            if cursor:
+                cases.append(
+                    (f'{name}/deep', 'get', f'{url}?cursor={cursor}', None)
+                )
+        # У поста нет страниц: «глубоко» — самый старый, холодный пост.
+        for name, pk in (('shallow', post_id), ('deep', oldest_id)):
+            cases.append((
+                f'post_detail/{name}', 'get',
+                reverse('posts:post_detail', kwargs={'post_id': pk}), None,
+            ))
+        cases.append((
+            'add_comment', 'post',
+            reverse('posts:add_comment', kwargs={'post_id': post_id}),
+            {'text': COMMENT_TEXT},
+        ))
+        cases.append((
+            'post_create', 'post', reverse('posts:post_create'),
+            {'text': POST_TEXT},
+        ))
+        return reader, cases
+
+    def request(self, client, method, url, data):
+        response = getattr(client, method)(url, data)
+        if response.status_code >= 400:
+            raise CommandError(f'{url}: ответ {response.status_code}')
+        return response
+
+    def measure(self, client, method, url, data, count, cached):
+        self.request(client, method, url, data)
+        timings = []
+        queries = []
+        for _ in range(count):
+            stats = RequestStats()
+            # Очистка кеша — подготовка замера, а не сам запрос.
+            if not cached:
+                cache.clear()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                started = time.perf_counter()
+                self.request(client, method, url, data)
+                timings.append(time.perf_counter() - started)
+            queries.append(stats.query_count)
+        # Память — отдельным запросом: tracemalloc в разы замедляет код.
+        if not cached:
+            cache.clear()
+        tracemalloc.start()
+        self.request(client, method, url, data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result = {
+            f'p{p}_ms': round(percentile(timings, p) * 1000, 3)
+            for p in PERCENTILES
+        }
+        result['queries'] = max(queries)
+        result['peak_kb'] = round(peak / 1024, 1)
+        return result
+
+    def run(self, options):
+        reader, cases = self.cases(options['depth'])
+        client = Client()
+        client.force_login(reader)
+        results = {}
+        # Каждый запрос коммитит сам, как в проде: запись платит
+        # за COMMIT, чтение идёт туда, куда его пошлёт роутер реплик.
+        # Созданное замерами удаляется после прогона. Панель
+        # django-debug-toolbar в замеры не попадает.
+        last_post = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        last_comment = Comment.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        try:
+            with override_settings(DEBUG=False):
+                for name, method, url, data in cases:
+                    results[name] = self.measure(
+                        client, method, url, data, options['requests'],
+                        options['cached'],
+                    )
+                    self.report(name, results[name])
+        finally:
+            with transaction.atomic():
+                Comment.objects.filter(
+                    pk__gt=last_comment, text=COMMENT_TEXT
+                ).delete()
+                Post.objects.filter(pk__gt=last_post, text=POST_TEXT).delete()
+        return results
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<22}' + ''.join(
+                f'{result[f"p{p}_ms"]:>10.2f}' for p in PERCENTILES
+            ) + f'{result["queries"]:>9}{result["peak_kb"]:>12.0f}'
+        )
+
+    def compare(self, results, baseline, threshold):
+        """Строки о регрессиях относительно baseline."""
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            for metric in COMPARED:
+                value, old = result[metric], before.get(metric)
+                if old is None:
+                    continue
+                if metric == 'queries':
+                    worse = value > old
+                elif metric.endswith('_ms'):
+                    worse = (value > old * (1 + threshold)
+                             and value - old >= MIN_DELTA_MS)
+                else:
+                    worse = value > old * (1 + threshold)
+                if worse:
+                    regressions.append(
+                        f'{name} {metric}: {old} -> {value}'
+                    )
+        return regressions
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"страница":<22}'
+            + ''.join(f'{f"p{p}, мс":>10}' for p in PERCENTILES)
+            + f'{"запросы":>9}{"память, КБ":>12}'
+        )
+        results = self.run(options)
+        report = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'posts': Post.objects.count(),
+                'requests': options['requests'],
+                'depth': options['depth'],
+                'cached': options['cached'],
+                # Запись замерена с COMMIT; прогоны до этого — без него.
+                'writes_committed': True,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if not options['compare']:
+            return
+        with open(options['compare'], encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline['meta']['posts'] != report['meta']['posts']:
+            self.stderr.write(
+                'Базовый прогон снят на другом наборе данных: '
+                f'{baseline["meta"]["posts"]} постов против '
+                f'{report["meta"]["posts"]}.'
+            )
+        regressions = self.compare(
+            results, baseline['results'], options['threshold']
+        )
+        for line in regressions:
+            self.stderr.write(f'Регрессия: {line}')
+        if regressions:
+            raise CommandError(f'Найдено регрессий: {len(regressions)}.')
+        self.stdout.write('Регрессий нет.')
@@ -0,0 +1,87 @@
+import hashlib
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.storage import hashed_name, is_hashed
+from posts import caching, images
+from posts.models import ImageBlob, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов, загруженные до хранилища по '
+        'содержимому, под имена-хеши: одинаковые файлы сливаются в один, '
+        'старые файлы и их превью удаляются, счётчики ссылок '
+        'пересчитываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, сколько места освободится.',
+        )
+
+    def digest(self, storage, name):
+        digest = hashlib.sha256()
+        with storage.open(name) as file:
+            for chunk in file.chunks():
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def move(self, storage, name):
+        """Новое имя файла; посты переключаются на него."""
+        with storage.open(name) as file:
+            new_name = storage.save(name, file)
+        posts = Post.objects.filter(image=name)
+        self.touched.update(posts.values_list('pk', 'author_id', 'group_id'))
+        with transaction.atomic():
+            posts.update(image=new_name)
+            ImageBlob.objects.filter(name=name).delete()
+        images.delete(name)
+        return new_name
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = list(Post.objects.exclude(image='').order_by(
+            'image'
+        ).values_list('image', flat=True).distinct())
+        seen = set(filter(is_hashed, names))
+        self.touched = set()
+        moved = merged = missing = freed = 0
+        for name in names:
+            if is_hashed(name):
+                continue
+            if not storage.exists(name):
+                missing += 1
+                self.stderr.write(f'Нет файла: {name}')
+                continue
+            size = storage.size(name)
+            if options['dry_run']:
+                new_name = hashed_name(name, self.digest(storage, name))
+            else:
+                new_name = self.move(storage, name)
+            if new_name in seen:
+                merged += 1
+                freed += size
+            seen.add(new_name)
+            moved += 1
+        verb = 'можно перенести' if options['dry_run'] else 'перенесено'
+        self.stdout.write(
+            f'Файлов {verb}: {moved}, из них дублей: {merged}, '
+            f'не найдено: {missing}. '
+            f'Место под дубли: {freed / 1024 / 1024:.1f} МБ.'
+        )
+        if options['dry_run']:
+            return
+        blobs = ImageBlob.objects.rebuild()
+        post_ids, author_ids, group_ids = (
+            zip(*self.touched) if self.touched else ((), (), ())
+        )
+        caching.bump_generations(caching.scopes_for_bulk(
+            set(author_ids), set(group_ids) - {None}, set(post_ids)
+        ))
+        self.stdout.write(
+            f'Уникальных картинок: {blobs}. Превью новых имён нарежет '
+            'pregenerate_thumbnails.'
+        )
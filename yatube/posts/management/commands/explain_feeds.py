@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Comment, Follow, Post, TimelineEntry
+from posts.paginator import NEXT, POSTS_PER_PAGE, keyset_queryset
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает планы запросов лент (EXPLAIN). Удобно сравнивать '
+        'на базе из seed_posts до и после миграции индексов: '
+        'migrate posts 0005 / migrate posts.'
+    )
+
+    def handle(self, *args, **options):
+        last = Post.objects.order_by('-pk').first()
+        if last is None:
+            raise CommandError('В базе нет постов, запустите seed_posts.')
+        # Пост из середины ленты — позиция «глубокой» страницы.
+        middle = Post.objects.filter(pk__gte=last.pk // 2).order_by(
+            'pk'
+        ).first()
+        limit = POSTS_PER_PAGE + 1
+        follower = Follow.objects.filter(author_id=middle.author_id).first()
+        reader_id = follower.user_id if follower else middle.author_id
+        queries = {
+            'index, первая страница': keyset_queryset(
+                Post.objects.feed(), None, None, None, limit
+            ),
+            'index, глубокая страница': keyset_queryset(
+                Post.objects.feed(), NEXT, middle.pub_date, middle.pk, limit
+            ),
+            'group_posts': keyset_queryset(
+                Post.objects.feed().filter(group_id=middle.group_id),
+                NEXT, middle.pub_date, middle.pk, limit
+            ),
+            'profile': keyset_queryset(
+                Post.objects.feed().filter(author_id=middle.author_id),
+                NEXT, middle.pub_date, middle.pk, limit
+            ),
+            'profile, подписан ли читатель': Follow.objects.filter(
+                user_id=reader_id, author_id=middle.author_id
+            )[:1],
+            'follow_index': keyset_queryset(
+                TimelineEntry.objects.filter(
+                    user_id=reader_id
+                ).values_list('post_id', flat=True),
+                NEXT, middle.pub_date, middle.pk, limit,
+                fields=('pub_date', 'post_id'),
+            ),
+            'post_detail, комментарии': keyset_queryset(
+                Comment.objects.filter(post_id=middle.pk),
+                None, None, None, limit
+            ),
+        }
+        for title, queryset in queries.items():
+            self.stdout.write(f'== {title}')
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain())
+            self.stdout.write('')
@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает посты или комментарии в NDJSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(export.EXPORTS))
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default='ndjson',
+        )
+        parser.add_argument(
+            '--after',
+            help='Продолжить после строки с позицией «pub_date|id».',
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжимать на лету.',
+        )
+        parser.add_argument(
+            '--output', help='Файл выгрузки; по умолчанию stdout.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=export.CHUNK_SIZE,
+            help='Сколько строк читать из базы за раз.',
+        )
+
+    def handle(self, *args, **options):
+        after = None
+        if options['after']:
+            try:
+                after = export.parse_position(options['after'])
+            except ValueError:
+                raise CommandError('--after ждёт позицию «pub_date|id».')
+        chunks = export.stream(
+            options['name'], options['format'], after,
+            compress=options['gzip'], chunk_size=options['chunk_size'],
+        )
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                output.writelines(chunks)
+        else:
+            sys.stdout.buffer.writelines(chunks)
+            sys.stdout.buffer.flush()
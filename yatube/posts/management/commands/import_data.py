@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import imports
+
+# Сколько ошибочных строк печатать.
+MAX_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, группы или посты из NDJSON или CSV '
+        'пачками bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(imports.IMPORTERS))
+        parser.add_argument(
+            'path', help="Файл (.gz распаковывается) или '-' для stdin.",
+        )
+        parser.add_argument(
+            '--format', choices=imports.FORMATS,
+            help='По умолчанию — по расширению файла.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=imports.BATCH_SIZE,
+            help='Сколько строк писать в одной транзакции.',
+        )
+        parser.add_argument(
+            '--no-refresh', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поиск после постов.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        name = path[:-3] if path.endswith('.gz') else path
+        import_format = options['format'] or (
+            'csv' if name.endswith('.csv') else 'ndjson'
+        )
+        try:
+            source = imports.open_source(path)
+        except OSError as error:
+            raise CommandError(error)
+        with source:
+            result = imports.IMPORTERS[options['name']](
+                imports.read_rows(source, import_format),
+                batch_size=options['batch_size'],
+            )
+        for error in result.errors[:MAX_ERRORS]:
+            self.stderr.write(error)
+        if len(result.errors) > MAX_ERRORS:
+            self.stderr.write(
+                f'… и ещё ошибок: {len(result.errors) - MAX_ERRORS}.'
+            )
+        self.stdout.write(
+            f'Записано строк: {result.written}, '
+            f'из них новых: {result.inserted}, '
+            f'пропущено: {result.skipped}, '
+            f'с ошибками: {len(result.errors)}.'
+        )
+        if options['name'] == 'posts' and not options['no_refresh']:
+            imports.refresh(result, stdout=self.stdout)
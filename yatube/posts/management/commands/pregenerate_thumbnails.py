@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts import caching, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Нарезает превью для уже загруженных картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько картинок резать параллельно.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=100)
+
+    def generate(self, post):
+        try:
+            thumbnails.generate(post.image)
+            return None
+        except Exception as error:
+            return f'{post.image.name}: {error}'
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only('image').iterator()
+        done = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                chunk = list(islice(posts, options['chunk_size']))
+                if not chunk:
+                    break
+                for error in pool.map(self.generate, chunk):
+                    if error:
+                        self.stderr.write(error)
+                done += len(chunk)
+                # Закешированные карточки ещё ссылаются на исходные файлы.
+                caching.bump_generations(
+                    [('post', post.pk) for post in chunk]
+                )
+        caching.bump_generations([caching.GLOBAL])
+        self.stdout.write(f'Обработано картинок: {done}.')
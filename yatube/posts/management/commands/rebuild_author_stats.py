@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import AuthorStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок авторов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько записей передавать в bulk_create за раз; '
+                 'размер INSERT подбирает Django.',
+        )
+
+    def handle(self, *args, **options):
+        total = AuthorStats.objects.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f'Пересчитана статистика {total} пользователей.')
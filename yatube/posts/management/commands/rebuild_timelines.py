@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок из Follow и Post.'
+
+    def handle(self, *args, **options):
+        timeline.rebuild()
+        self.stdout.write('Ленты подписок пересобраны.')
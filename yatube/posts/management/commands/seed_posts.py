@@ -0,0 +1,145 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts.bulk import batches, explicit_pub_date
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+DEFAULTS = {
+    'posts': 10000, 'users': 1000, 'groups': 50, 'comments': 0,
+    'follows': 20, 'skew': 0.0,
+}
+# Наборы для benchmark_views: авторы, группы и подписки распределены
+# по Ципфу — немного популярных, длинный хвост почти пустых.
+SCALES = {
+    '10k': {'posts': 10000, 'users': 1000, 'groups': 50,
+            'comments': 10000, 'skew': 1.1},
+    '100k': {'posts': 100000, 'users': 10000, 'groups': 200,
+             'comments': 100000, 'skew': 1.1},
+    '1m': {'posts': 1000000, 'users': 50000, 'groups': 1000,
+           'comments': 1000000, 'skew': 1.1},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу тестовыми пользователями, группами, постами, '
+        'комментариями и подписками для замеров производительности.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES,
+                            help='Готовый набор данных; явные параметры '
+                                 'его перекрывают.')
+        parser.add_argument('--posts', type=int)
+        parser.add_argument('--users', type=int)
+        parser.add_argument('--groups', type=int)
+        parser.add_argument('--comments', type=int)
+        parser.add_argument('--follows', type=int,
+                            help='Подписок на одного пользователя.')
+        parser.add_argument('--skew', type=float,
+                            help='Показатель Ципфа для авторов, групп '
+                                 'и подписок; 0 — равномерно.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-rebuild', action='store_true',
+                            help='Не пересобирать счётчики и ленты.')
+
+    def bulk(self, model, objects, batch_size):
+        # Сигналы не срабатывают: счётчики и ленты пересобираются в конце.
+        for batch in batches(objects, batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def chooser(self, rnd, items, skew, shuffle=True):
+        """Выбор из items с весами 1 / rank ** skew.
+
+        Популярными становятся случайные элементы, а без shuffle —
+        первые по порядку.
+        """
+        items = list(items)
+        if shuffle:
+            rnd.shuffle(items)
+        weights = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(items) + 1)
+        ))
+        return lambda k=1: rnd.choices(items, cum_weights=weights, k=k)
+
+    def handle(self, *args, **options):
+        for name, value in dict(
+            DEFAULTS, **SCALES.get(options['scale'], {})
+        ).items():
+            if options[name] is None:
+                options[name] = value
+        rnd = random.Random(options['seed'])
+        skew = options['skew']
+        batch_size = options['batch_size']
+        prefix = f'seed{options["seed"]}'
+        self.bulk(User, (
+            User(username=f'{prefix}_user_{i}', first_name='Автор',
+                 last_name=str(i))
+            for i in range(options['users'])
+        ), batch_size)
+        self.bulk(Group, (
+            Group(title=f'Группа {i}', slug=f'{prefix}-group-{i}',
+                  description='Описание группы')
+            for i in range(options['groups'])
+        ), batch_size)
+        user_ids = list(User.objects.filter(
+            username__startswith=f'{prefix}_user_'
+        ).values_list('id', flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith=f'{prefix}-group-'
+        ).values_list('id', flat=True))
+        # Кто много пишет и на кого много подписаны — разные люди,
+        # иначе ленты подписок разрастаются на порядки быстрее постов.
+        author = self.chooser(rnd, user_ids, skew)
+        followed = self.chooser(rnd, user_ids, skew)
+        group = self.chooser(rnd, group_ids + [None], skew)
+        start = timezone.now() - timedelta(days=365)
+        step = timedelta(days=365) / max(options['posts'], 1)
+        # Посты ложатся по всему прошедшему году.
+        with explicit_pub_date(Post):
+            self.bulk(Post, (
+                Post(author_id=author()[0],
+                     group_id=group()[0],
+                     text=f'Тестовый пост {i}',
+                     pub_date=start + step * i)
+                for i in range(options['posts'])
+            ), batch_size)
+        follows = min(options['follows'], len(user_ids) - 1)
+        # Повторы при выборе с весами отбрасывает ignore_conflicts.
+        self.bulk(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in set(followed(follows))
+            if author_id != user_id
+        ), batch_size)
+        if options['comments']:
+            post_ids = list(Post.objects.order_by('-pub_date').values_list(
+                'id', flat=True
+            ))
+            # Свежие посты комментируют чаще старых.
+            commented = self.chooser(rnd, post_ids, skew, shuffle=False)
+            self.bulk(Comment, (
+                Comment(post_id=commented()[0],
+                        author_id=author()[0],
+                        text=f'Комментарий {i}')
+                for i in range(options['comments'])
+            ), batch_size)
+        if options['no_rebuild']:
+            return
+        self.stdout.write(
+            'Данные созданы, пересчитываем счётчики, ленты и индекс поиска.'
+        )
+        call_command('rebuild_author_stats', stdout=self.stdout)
+        call_command('rebuild_timelines', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
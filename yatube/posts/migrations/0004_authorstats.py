@@ -0,0 +1,52 @@
+# Generated by Django 2.2.6 on 2026-10-18 17:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_author_stats(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    totals = {}
+    sources = (
+        ('posts', apps.get_model('posts', 'Post'), 'author'),
+        ('comments', apps.get_model('posts', 'Comment'), 'author'),
+        ('followers', apps.get_model('posts', 'Follow'), 'author'),
+        ('following', apps.get_model('posts', 'Follow'), 'user'),
+    )
+    for name, model, field in sources:
+        rows = model.objects.order_by().values_list(field).annotate(
+            count=models.Count('pk')
+        )
+        for user_id, count in rows:
+            totals.setdefault(user_id, {})[name] = count
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=user_id, **counters)
+         for user_id, counters in totals.items()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0003_auto_20261018_1708'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Статистика автора',
+                'verbose_name_plural': 'Статистика авторов',
+            },
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
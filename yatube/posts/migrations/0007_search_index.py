@@ -0,0 +1,81 @@
+# Generated by Django 2.2.6 on 2026-10-18 17:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+from collections import Counter
+
+FTS_TABLE = 'posts_post_fts'
+WORD_RE = re.compile(r'\w+')
+
+
+def has_fts5(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def uses_fts5(connection):
+    # Как posts.search.get_index.
+    name = getattr(settings, 'POSTS_SEARCH_INDEX', None)
+    if name is None:
+        return has_fts5(connection)
+    return name == 'fts5'
+
+
+def create_index(apps, schema_editor):
+    if uses_fts5(schema_editor.connection):
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(text)'
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) '
+            f'SELECT id, text FROM posts_post'
+        )
+        return
+    Post = apps.get_model('posts', 'Post')
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    for pk, text in Post.objects.values_list('pk', 'text').iterator():
+        words = Counter(
+            word[:64] for word in WORD_RE.findall(text.lower())
+        )
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, post_id=pk, frequency=frequency)
+            for term, frequency in words.items()
+        )
+
+
+def drop_index(apps, schema_editor):
+    if has_fts5(schema_editor.connection):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Слово')),
+                ('frequency', models.PositiveIntegerField(verbose_name='Сколько раз встречается')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Слово поиска',
+                'verbose_name_plural': 'Слова поиска',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_search_term'),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
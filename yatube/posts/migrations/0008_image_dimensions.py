@@ -0,0 +1,42 @@
+# Generated by Django 2.2.6 on 2026-10-18 18:07
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from PIL import Image
+
+
+def fill_dimensions(apps, schema_editor):
+    # Размеры уже загруженных картинок — из заголовков файлов.
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.exclude(image='').values_list('pk', 'image')
+    for pk, name in posts.iterator():
+        try:
+            with default_storage.open(name) as file, \
+                    Image.open(file) as image:
+                width, height = image.size
+        except (OSError, Image.DecompressionBombError):
+            continue
+        Post.objects.filter(pk=pk).update(
+            image_width=width, image_height=height
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.RunPython(fill_dimensions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.6 on 2026-10-18 18:10
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_references(apps, schema_editor):
+    # Старые файлы лежат под прежними именами; в хранилище по
+    # содержимому их переносит команда dedupe_media.
+    Post = apps.get_model('posts', 'Post')
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    counts = Post.objects.exclude(image='').order_by().values_list(
+        'image'
+    ).annotate(count=Count('pk'))
+    for name, count in counts.iterator():
+        ImageBlob.objects.create(name=name, references=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
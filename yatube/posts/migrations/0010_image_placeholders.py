@@ -0,0 +1,45 @@
+# Generated by Django 2.2.6 on 2026-10-18 18:13
+
+import base64
+from io import BytesIO
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from PIL import Image, ImageOps
+
+
+def fill_placeholders(apps, schema_editor):
+    # То же, что posts.images.placeholder, для уже загруженных картинок.
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.exclude(image='').values_list('pk', 'image')
+    for pk, name in posts.iterator():
+        try:
+            with default_storage.open(name) as file, \
+                    Image.open(file) as image:
+                image.draft('RGB', (64, 64))
+                small = ImageOps.fit(image.convert('RGB'), (16, 6),
+                                     Image.BILINEAR)
+        except (OSError, Image.DecompressionBombError):
+            continue
+        content = BytesIO()
+        small.save(content, 'WEBP', quality=40)
+        Post.objects.filter(pk=pk).update(
+            image_placeholder='data:image/webp;base64,'
+            + base64.b64encode(content.getvalue()).decode('ascii')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_image_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Заглушка картинки'),
+        ),
+        migrations.RunPython(fill_placeholders, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
 from django.contrib.auth import get_user_model
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
+
+from .bulk import batches
 
 User = get_user_model()
 
@@ -14,6 +19,22 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    # Поля, которые нужны карточке поста в лентах и на странице поста.
+    FEED_FIELDS = (
+        'text', 'pub_date', 'image', 'image_width', 'image_height',
+        'image_placeholder',
+        'author', 'author__username',
+        'author__first_name', 'author__last_name',
+        'group', 'group__title', 'group__slug',
+    )
+
+    def feed(self):
+        """Посты для лент: автор и группа подтягиваются одним JOIN,
+        лишние колонки (пароль автора, описание группы) не читаются."""
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+
 class Post(CreatedModel):
     text = models.TextField(
         'Текст поста',
@@ -36,19 +57,53 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    # Размеры сохранённой картинки, их заполняет PostForm
+    # (см. posts/images.py). Не width_field у ImageField: тот при
+    # пустых полях открывает файл на каждом создании объекта.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False
+    )
+    # Крошечная копия картинки (data: URI), видна, пока грузится превью.
+    image_placeholder = models.TextField(
+        'Заглушка картинки', blank=True, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx'
+            ),
+        ]
 
     def __str__(self):
         # выводим текст поста
         return self.text[:15]
 
 
+class CommentQuerySet(models.QuerySet):
+    def for_post(self, post_id):
+        """Комментарии поста вместе с именем автора, одним JOIN."""
+        return self.filter(post_id=post_id).select_related('author').only(
+            'text', 'pub_date', 'post', 'author__username'
+        )
+
+
 class Comment(CreatedModel):
     post = models.ForeignKey(
         Post,
@@ -69,10 +124,18 @@ class Comment(CreatedModel):
         help_text='Введите текст комментария'
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ["-pub_date"]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-pub_date', '-id'],
+                name='comment_post_date_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -86,3 +149,200 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок пользователя.
+
+    Строки раскладываются при публикации поста (fan-out on write),
+    так что лента подписок читается одним проходом по индексу
+    (user, -pub_date, -post) без JOIN с Follow.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    # Копия post.pub_date: сортировка и курсор работают по этой таблице.
+    pub_date = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx'
+            ),
+        ]
+
+
+class SearchTerm(models.Model):
+    """Запись инвертированного индекса поиска: слово поста и его частота.
+
+    Нужна, только если у базы нет FTS5, см. posts.search.
+    """
+    term = models.CharField('Слово', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Пост'
+    )
+    frequency = models.PositiveIntegerField('Сколько раз встречается')
+
+    class Meta:
+        verbose_name = 'Слово поиска'
+        verbose_name_plural = 'Слова поиска'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'], name='unique_search_term'
+            ),
+        ]
+
+
+class AuthorStatsManager(models.Manager):
+    COUNTERS = ('posts', 'comments', 'followers', 'following')
+
+    def for_user(self, user):
+        """Счётчики пользователя; для новичка — несохранённые нули."""
+        return self.filter(user=user).first() or self.model(user=user)
+
+    def bump(self, user_id, **deltas):
+        """Атомарно сдвигает счётчики пользователя: bump(1, posts=1)."""
+        changes = {
+            name: Greatest(F(name) + delta, 0)
+            for name, delta in deltas.items()
+        }
+        updated = self.filter(user_id=user_id).update(**changes)
+        if not updated and any(delta > 0 for delta in deltas.values()):
+            # Запись создаётся только при росте: при удалении
+            # пользователя каскадом её уже не должно появиться.
+            self.get_or_create(user_id=user_id)
+            self.filter(user_id=user_id).update(**changes)
+
+    def rebuild(self, batch_size=1000):
+        """Пересчитывает все счётчики с нуля по Post, Comment и Follow."""
+        totals = {}
+        # order_by() сбрасывает Meta.ordering, иначе pub_date попадёт
+        # в GROUP BY и счётчики развалятся по датам.
+        sources = (
+            ('posts', Post.objects.order_by().values_list('author')),
+            ('comments', Comment.objects.order_by().values_list('author')),
+            ('followers', Follow.objects.order_by().values_list('author')),
+            ('following', Follow.objects.order_by().values_list('user')),
+        )
+        for name, rows in sources:
+            for user_id, count in rows.annotate(count=Count('pk')):
+                totals.setdefault(user_id, {})[name] = count
+        with transaction.atomic():
+            self.all().delete()
+            # Размер INSERT подбирает Django: явный batch_size
+            # в Django 2.2 не урезается до лимитов SQLite.
+            for batch in batches(
+                (self.model(user_id=user_id, **counters)
+                 for user_id, counters in totals.items()),
+                batch_size,
+            ):
+                self.bulk_create(batch)
+        return len(totals)
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики пользователя для профиля и поста."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts = models.PositiveIntegerField('Постов', default=0)
+    comments = models.PositiveIntegerField('Комментариев', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+
+    objects = AuthorStatsManager()
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.posts}'
+
+
+class ImageBlobManager(models.Manager):
+    def acquire(self, name):
+        """Ещё один пост ссылается на файл name."""
+        if not self.filter(name=name).update(references=F('references') + 1):
+            blob, created = self.get_or_create(
+                name=name, defaults={'references': 1}
+            )
+            if not created:
+                self.filter(name=name).update(
+                    references=F('references') + 1
+                )
+
+    def release(self, name):
+        """Пост больше не ссылается на name; True, если ссылок
+        не осталось и файл можно удалять."""
+        with transaction.atomic():
+            self.filter(name=name).update(
+                references=Greatest(F('references') - 1, 0)
+            )
+            deleted, _ = self.filter(name=name, references=0).delete()
+        return bool(deleted)
+
+    def rebuild(self, batch_size=1000):
+        """Пересчитывает ссылки с нуля по Post."""
+        counts = Post.objects.exclude(image='').order_by().values_list(
+            'image'
+        ).annotate(count=Count('pk'))
+        with transaction.atomic():
+            self.all().delete()
+            for batch in batches(
+                (self.model(name=name, references=count)
+                 for name, count in counts.iterator()),
+                batch_size,
+            ):
+                self.bulk_create(batch)
+        return self.count()
+
+
+class ImageBlob(models.Model):
+    """Файл картинки в хранилище по содержимому и число постов с ним.
+
+    Один файл могут делить тысячи постов; удаляется он, когда уходит
+    последняя ссылка (см. posts.images.release).
+    """
+    name = models.CharField('Файл', max_length=255, unique=True)
+    references = models.PositiveIntegerField('Ссылок', default=0)
+
+    objects = ImageBlobManager()
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return f'{self.name}: {self.references}'
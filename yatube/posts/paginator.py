@@ -0,0 +1,179 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+# Направления курсора: следующая, предыдущая и последняя страница.
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+
+
+class InvalidCursor(ValueError):
+    """Курсор повреждён или подделан."""
+
+
+def position(row):
+    """(pub_date, id) объекта или строки values() с этими полями."""
+    if isinstance(row, dict):
+        return row['pub_date'], row['id']
+    return row.pub_date, row.pk
+
+
+def encode_cursor(direction, post=None):
+    """Упаковывает позицию поста или комментария (pub_date, id)
+    в непрозрачную строку."""
+    raw = direction
+    if post is not None:
+        pub_date, pk = position(post)
+        raw += f'{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (направление, pub_date, id) из строки курсора."""
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding).decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    direction, position = raw[:1], raw[1:]
+    if direction == LAST and not position:
+        return direction, None, None
+    if direction not in (NEXT, PREVIOUS):
+        raise InvalidCursor(cursor)
+    pub_date, _, pk = position.rpartition('|')
+    try:
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except ValueError:
+        raise InvalidCursor(cursor)
+    if pub_date is None:
+        raise InvalidCursor(cursor)
+    return direction, pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница ленты без номера: соседние страницы задаются курсорами."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self.object_list)} objects>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return encode_cursor(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return encode_cursor(PREVIOUS, self.object_list[0])
+
+    @property
+    def last_cursor(self):
+        return encode_cursor(LAST)
+
+
+def is_backward(direction):
+    """Предыдущая и последняя страницы читаются от старых постов к новым."""
+    return direction in (PREVIOUS, LAST)
+
+
+def keyset_queryset(queryset, direction, pub_date, pk, limit,
+                    fields=('pub_date', 'pk')):
+    """Срез из limit строк за позицией (pub_date, pk) в порядке обхода.
+
+    fields позволяет листать модели, где позиция поста хранится
+    в других колонках, например копии pub_date и post_id.
+    """
+    date_field, pk_field = fields
+    # Лишнее на вид условие по одной дате даёт SQLite границу диапазона
+    # для поиска по индексу; без него OR превращается в полный проход.
+    if direction == NEXT:
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__lte': pub_date}),
+            Q(**{f'{date_field}__lt': pub_date})
+            | Q(**{date_field: pub_date, f'{pk_field}__lt': pk}),
+        )
+    elif direction == PREVIOUS:
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__gte': pub_date}),
+            Q(**{f'{date_field}__gt': pub_date})
+            | Q(**{date_field: pub_date, f'{pk_field}__gt': pk}),
+        )
+    if is_backward(direction):
+        ordering = (date_field, pk_field)
+    else:
+        ordering = (f'-{date_field}', f'-{pk_field}')
+    return queryset.order_by(*ordering)[:limit]
+
+
+def keyset_slice(queryset, direction, pub_date, pk, limit,
+                 fields=('pub_date', 'pk')):
+    """Один запрос: строки keyset_queryset списком."""
+    return list(keyset_queryset(
+        queryset, direction, pub_date, pk, limit, fields
+    ))
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (pub_date, id).
+
+    Вместо OFFSET и COUNT(*) каждая страница — это один запрос
+    с условием на позицию последнего показанного поста, который
+    обслуживается индексом по pub_date (в SQLite индекс неявно
+    содержит rowid, так что сортировка по (pub_date, id) идёт по нему).
+    Поэтому любая глубина ленты стоит столько же, сколько первая страница.
+    """
+
+    def fetch(self, direction, pub_date, pk, limit):
+        """Посты за позицией курсора в порядке обхода."""
+        return keyset_slice(
+            self.object_list, direction, pub_date, pk, limit
+        )
+
+    def get_page(self, cursor):
+        try:
+            direction, pub_date, pk = decode_cursor(cursor or '')
+        except InvalidCursor:
+            direction, pub_date, pk = None, None, None
+        per_page = self.per_page
+        rows = self.fetch(direction, pub_date, pk, per_page + 1)
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if is_backward(direction):
+            # Шли по индексу в обратную сторону — разворачиваем.
+            return CursorPage(
+                rows[::-1], self,
+                has_next=direction == PREVIOUS,
+                has_previous=has_more,
+            )
+        return CursorPage(
+            rows, self,
+            has_next=has_more,
+            has_previous=direction == NEXT,
+        )
+
+
+def paginate(request, queryset, per_page=POSTS_PER_PAGE):
+    """Страница ленты по курсору из ?cursor=."""
+    paginator = CursorPaginator(queryset, per_page)
+    return paginator.get_page(request.GET.get('cursor'))
@@ -0,0 +1,217 @@
+"""Полнотекстовый поиск по постам на инвертированном индексе.
+
+На SQLite с FTS5 индекс — виртуальная таблица posts_post_fts
+(rowid = id поста), ранжирование — bm25 самой SQLite. На остальных
+базах индекс хранится в SearchTerm (слово, пост, частота), а
+ранжирует TF-IDF на Python. Оба индекса обновляются сигналами Post
+и пересобираются командой rebuild_search_index.
+
+Слова запроса объединяются через AND: пост должен содержать все.
+"""
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Post, SearchTerm
+
+FTS_TABLE = 'posts_post_fts'
+WORD_RE = re.compile(r'\w+')
+TERM_MAX_LENGTH = 64
+BATCH_SIZE = 1000
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре, как их хранит индекс."""
+    return [
+        word[:TERM_MAX_LENGTH] for word in WORD_RE.findall(text.lower())
+    ]
+
+
+@lru_cache(maxsize=None)
+def has_fts5():
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+class Fts5Index:
+    """Индекс в виртуальной таблице FTS5."""
+
+    @staticmethod
+    def match(words):
+        # Каждое слово в кавычках: операторы FTS5 из запроса
+        # пользователя не выполняются.
+        return ' '.join('"{}"'.format(word.replace('"', '""'))
+                        for word in words)
+
+    def add(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text],
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def rebuild(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}'
+            )
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+            return cursor.fetchone()[0]
+
+    def count(self, words):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [self.match(words)],
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, words, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                [self.match(words), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter(self, queryset, words):
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            where=[f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+                   f'WHERE {FTS_TABLE} MATCH %s)'],
+            params=[self.match(words)],
+        )
+
+
+class TermIndex:
+    """Индекс в таблице SearchTerm для баз без FTS5."""
+
+    def entries(self, post):
+        frequencies = Counter(tokenize(post.text))
+        return [
+            SearchTerm(term=term, post_id=post.pk, frequency=frequency)
+            for term, frequency in frequencies.items()
+        ]
+
+    def add(self, post):
+        with transaction.atomic():
+            self.remove(post.pk)
+            SearchTerm.objects.bulk_create(self.entries(post))
+
+    def remove(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def rebuild(self):
+        with transaction.atomic():
+            SearchTerm.objects.all().delete()
+            posts = Post.objects.only('text').order_by()
+            batch = []
+            for post in posts.iterator():
+                batch += self.entries(post)
+                if len(batch) >= BATCH_SIZE:
+                    SearchTerm.objects.bulk_create(batch)
+                    batch = []
+            SearchTerm.objects.bulk_create(batch)
+            return posts.count()
+
+    def matching(self, words):
+        """id постов, где есть все слова запроса."""
+        words = set(words)
+        return SearchTerm.objects.filter(term__in=words).order_by().values(
+            'post'
+        ).annotate(found=Count('term')).filter(
+            found=len(words)
+        ).values('post')
+
+    def count(self, words):
+        return self.matching(words).count()
+
+    def ranked_ids(self, words, offset, limit):
+        words = set(words)
+        total = Post.objects.count()
+        # IDF — по всему корпусу, а не по найденным постам: среди них
+        # все слова запроса встречаются одинаково часто.
+        documents = dict(SearchTerm.objects.filter(
+            term__in=words
+        ).order_by().values_list('term').annotate(count=Count('post')))
+        postings = SearchTerm.objects.filter(
+            term__in=words, post__in=self.matching(words)
+        ).values_list('term', 'post_id', 'frequency')
+        scores = Counter()
+        for term, post_id, frequency in postings:
+            idf = math.log(1 + total / documents[term])
+            scores[post_id] += (1 + math.log(frequency)) * idf
+        ranked = sorted(scores, key=lambda pk: (-scores[pk], -pk))
+        return ranked[offset:offset + limit]
+
+    def filter(self, queryset, words):
+        return queryset.filter(pk__in=self.matching(words))
+
+
+def get_index():
+    """Индекс из settings.POSTS_SEARCH_INDEX: 'fts5', 'terms'
+    или None — FTS5, если SQLite его поддерживает."""
+    name = getattr(settings, 'POSTS_SEARCH_INDEX', None)
+    if name is None:
+        name = 'fts5' if has_fts5() else 'terms'
+    return Fts5Index() if name == 'fts5' else TermIndex()
+
+
+class SearchResults:
+    """Найденные посты по убыванию релевантности.
+
+    Ведёт себя как последовательность для Paginator: count() и срез
+    стоят по одному запросу к индексу, посты страницы читаются
+    одним запросом feed().
+    """
+
+    def __init__(self, query, index=None):
+        self.words = tokenize(query)
+        self.index = index or get_index()
+
+    def count(self):
+        if not self.words:
+            return 0
+        return self.index.count(self.words)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        if not self.words:
+            return []
+        offset = item.start or 0
+        ids = self.index.ranked_ids(self.words, offset, item.stop - offset)
+        posts = Post.objects.feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def filter_posts(queryset, query):
+    """Посты queryset, в которых есть все слова запроса."""
+    words = tokenize(query)
+    if not words:
+        return queryset.none()
+    return get_index().filter(queryset, words)
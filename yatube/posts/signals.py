@@ -0,0 +1,173 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core.storage import blob_saved
+
+from . import caching, images, search, timeline
+from .models import (AuthorStats, Comment, Follow, Group, ImageBlob, Post,
+                     TimelineEntry)
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    # Пост могли перенести в другую группу: её лента тоже устареет.
+    # Старая картинка нужна, чтобы снять с её файла ссылку.
+    previous = Post.objects.filter(pk=instance.pk).values_list(
+        'group_id', 'image'
+    ).first() if instance.pk else None
+    instance._previous_group_ids = [previous[0]] if previous else []
+    instance._previous_image = previous[1] if previous else ''
+    # Новый файл сохранится дальше в save(), и ссылку на него запишет
+    # получатель blob_saved.
+    instance._image_uploaded = bool(
+        instance.image and not instance.image._committed
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.bump(instance.author_id, posts=1)
+        timeline.fan_out(instance)
+    else:
+        TimelineEntry.objects.filter(post=instance).update(
+            pub_date=instance.pub_date
+        )
+    previous_image = getattr(instance, '_previous_image', '')
+    if getattr(instance, '_image_uploaded', False):
+        # Ту же картинку загрузили заново — release снимет лишнюю ссылку.
+        images.release(previous_image)
+    elif instance.image.name != previous_image:
+        images.acquire(instance.image.name)
+        images.release(previous_image)
+    search.get_index().add(instance)
+    caching.bump_generations(caching.scopes_for_post(
+        instance, getattr(instance, '_previous_group_ids', ())
+    ))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    AuthorStats.objects.bump(instance.author_id, posts=-1)
+    images.release(instance.image.name)
+    search.get_index().remove(instance.pk)
+    caching.bump_generations(caching.scopes_for_post(instance))
+
+
+@receiver(blob_saved)
+def image_stored(sender, name, **kwargs):
+    # Ссылка записывается под блокировкой хранилища, раньше, чем
+    # images.delete успеет решить, что файл никому не нужен. Если пост
+    # потом не сохранится, ссылка останется лишней: файл не удалится,
+    # пока ImageBlob.objects.rebuild() не пересчитает ссылки.
+    ImageBlob.objects.acquire(name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.bump(instance.author_id, comments=1)
+    caching.bump_generations([('post', instance.post_id)])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    AuthorStats.objects.bump(instance.author_id, comments=-1)
+    caching.bump_generations([('post', instance.post_id)])
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.bump(instance.author_id, followers=1)
+        AuthorStats.objects.bump(instance.user_id, following=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+    caching.bump_generations(caching.scopes_for_follow(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    timeline.follower_lost(instance.author_id)
+    AuthorStats.objects.bump(instance.user_id, following=-1)
+    timeline.prune(instance.user_id, instance.author_id)
+    caching.bump_generations(caching.scopes_for_follow(instance))
+
+
+def posts_scopes(posts):
+    """Ленты постов и их авторов: в них видны имена и группы."""
+    rows = list(posts.values_list('pk', 'author_id', 'group_id'))
+    return caching.scopes_for_bulk(
+        author_ids={author_id for _, author_id, _ in rows},
+        group_ids={group_id for _, _, group_id in rows} - {None},
+        post_ids=[pk for pk, _, _ in rows],
+    )
+
+
+@receiver(pre_save, sender=Group)
+def group_changing(sender, instance, **kwargs):
+    previous = Group.objects.filter(pk=instance.pk).values_list(
+        'slug', 'title'
+    ).first() if instance.pk else None
+    instance._previous_slugs = [previous[0]] if previous else []
+    # Название и адрес группы есть в карточках её постов — на главной,
+    # в профилях и на страницах постов.
+    instance._renamed = bool(
+        previous and previous != (instance.slug, instance.title)
+    )
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # После удаления у постов уже не будет группы.
+    instance._post_scopes = posts_scopes(
+        Post.objects.filter(group=instance)
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    slugs = {instance.slug, *getattr(instance, '_previous_slugs', ())}
+    scopes = [caching.GLOBAL] + [('group', slug) for slug in slugs]
+    if getattr(instance, '_renamed', False):
+        scopes += posts_scopes(Post.objects.filter(group=instance))
+    scopes += getattr(instance, '_post_scopes', [])
+    caching.bump_generations(scopes)
+
+
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, update_fields=None, **kwargs):
+    # Вход сохраняет только last_login — имена тогда не меняются.
+    if not instance.pk or (
+        update_fields is not None
+        and not set(update_fields) & set(USER_NAME_FIELDS)
+    ):
+        instance._previous_names = None
+        return
+    instance._previous_names = User.objects.filter(
+        pk=instance.pk
+    ).values_list(*USER_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    """Имя автора есть в карточках его постов и в его комментариях."""
+    previous = getattr(instance, '_previous_names', None)
+    names = tuple(getattr(instance, field) for field in USER_NAME_FIELDS)
+    if created or previous is None or previous == names:
+        return
+    scopes = posts_scopes(Post.objects.filter(author=instance))
+    scopes += [('author', previous[0]), ('author', instance.username)]
+    scopes += [
+        ('post', post_id) for post_id in set(Comment.objects.filter(
+            author=instance
+        ).values_list('post_id', flat=True))
+    ]
+    caching.bump_generations(scopes)
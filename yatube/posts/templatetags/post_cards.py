@@ -0,0 +1,26 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.fragments import CARD_TEMPLATE, render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, template_name=CARD_TEMPLATE):
+    """Карточка поста из кеша.
+
+    При первом вызове на странице достаёт карточки всех постов
+    page_obj разом, дальше берёт готовые.
+    """
+    key = ('post_cards', template_name)
+    cards = context.render_context.get(key)
+    if cards is None:
+        page = context.get('page_obj') or [post]
+        cards = context.render_context[key] = render_cards(
+            page, template_name, context.get('thumbnails')
+        )
+    html = cards.get(post.pk)
+    if html is None:
+        html = render_cards([post], template_name)[post.pk]
+    return mark_safe(html)
@@ -0,0 +1,95 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from posts import thumbnails
+
+register = template.Library()
+
+# Ширина картинки на странице: во всю ширину до lg, дальше — не шире
+# контейнера с карточкой.
+SIZES = '(max-width: 992px) 100vw, 960px'
+CARD_WIDTH, CARD_HEIGHT = 960, 339
+
+
+def find_thumbnails(context, post, variants):
+    """{вариант: готовое превью или None} для картинки поста.
+
+    Превью не режутся в запросе: пока их нет, картинка ставится
+    в очередь на нарезку. Если вьюха положила в контекст thumbnails,
+    превью берутся оттуда.
+    """
+    page_thumbnails = context.get('thumbnails')
+    if page_thumbnails is not None:
+        found = {
+            variant: page_thumbnails.get(post, variant)
+            for variant in variants
+        }
+    else:
+        found = {
+            variant: thumbnails.lookup(post.image, variant)
+            for variant in variants
+        }
+    if None in found.values() and thumbnails.schedule(post):
+        found = {
+            variant: thumbnails.lookup(post.image, variant)
+            for variant in variants
+        }
+    return found
+
+
+@register.simple_tag(takes_context=True)
+def post_image_url(context, post, variant='card'):
+    """URL готового превью картинки поста; пока его нет — исходный файл."""
+    if not post.image:
+        return ''
+    thumbnail = find_thumbnails(context, post, [variant])[variant]
+    if thumbnail is None:
+        return post.image.url
+    return thumbnail.url
+
+
+@register.simple_tag(takes_context=True)
+def post_image(context, post, css_class='card-img my-2', loading='lazy'):
+    """<img> картинки поста со srcset из нарезанных ширин карточки.
+
+    srcset собирается из тех ширин, что уже есть: у старых постов
+    до pregenerate_thumbnails есть только 960. Исходный файл отдаётся,
+    лишь пока не нарезано ни одного превью. Заглушка из
+    Post.image_placeholder лежит фоном и видна, пока картинка грузится.
+    """
+    if not post.image:
+        return ''
+    found = find_thumbnails(
+        context, post, [variant for variant, _ in thumbnails.SRCSET]
+    )
+    widths = [
+        (found[variant], width) for variant, width in thumbnails.SRCSET
+        if found[variant] is not None
+    ]
+    attrs = [('class', css_class)]
+    if not widths:
+        attrs.append(('src', post.image.url))
+        if post.image_width and post.image_height:
+            attrs += [('width', post.image_width),
+                      ('height', post.image_height)]
+    else:
+        src = found['card'] or widths[-1][0]
+        attrs += [
+            ('src', src.url),
+            ('srcset', ', '.join(
+                f'{thumbnail.url} {width}w' for thumbnail, width in widths
+            )),
+            ('sizes', SIZES),
+            ('width', CARD_WIDTH),
+            ('height', CARD_HEIGHT),
+        ]
+    attrs += [('loading', loading), ('decoding', 'async'), ('alt', '')]
+    style = 'height: auto;'
+    if post.image_placeholder:
+        style += (
+            f' background: url({post.image_placeholder}) center / cover;'
+        )
+    attrs.append(('style', style))
+    return format_html(
+        '<img{}>', format_html_join('', ' {}="{}"', attrs)
+    )
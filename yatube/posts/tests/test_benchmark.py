@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts.models import AuthorStats, Comment, Post
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_posts', posts=60, users=10, groups=3, comments=20,
+            follows=3, skew=1.1, stdout=StringIO(),
+        )
+
+    def benchmark(self, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'result.json')
+            call_command(
+                'benchmark_views', '--requests', '2', '--depth', '2',
+                '--output', path, *args, stdout=StringIO(), stderr=StringIO(),
+            )
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+
+    def test_seed_is_skewed(self):
+        """Самый активный автор пишет заметно больше среднего."""
+        top = AuthorStats.objects.order_by('-posts').first()
+        self.assertGreater(top.posts, 60 / 10 * 2)
+
+    def test_benchmark_writes_json_and_leaves_no_data(self):
+        comments = Comment.objects.count()
+        report = self.benchmark()
+        self.assertEqual(report['meta']['posts'], 60)
+        for name in ('index/shallow', 'index/deep', 'follow_index/deep',
+                     'post_detail/shallow', 'add_comment', 'post_create'):
+            self.assertEqual(
+                set(report['results'][name]),
+                {'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'peak_kb'},
+            )
+        self.assertEqual(Comment.objects.count(), comments)
+        self.assertEqual(Post.objects.count(), 60)
+
+    def test_compare_flags_regressions(self):
+        """Лишний запрос к базе против базового прогона — регрессия."""
+        report = self.benchmark()
+        report['results']['index/shallow']['queries'] -= 1
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as baseline:
+            json.dump(report, baseline)
+            baseline.flush()
+            with self.assertRaisesMessage(CommandError, 'регрессий'):
+                self.benchmark('--compare', baseline.name)
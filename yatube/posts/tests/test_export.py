@@ -0,0 +1,91 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_user(
+            username='admin', is_staff=True
+        )
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.user, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.admin_client = Client()
+        self.admin_client.force_login(ExportTests.admin)
+
+    def export(self, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'export')
+            call_command('export_data', *args, '--output', path,
+                         '--chunk-size', '2', stdout=StringIO())
+            with open(path, 'rb') as output:
+                return output.read()
+
+    def test_ndjson_resumes_after_position(self):
+        """Выгрузка продолжается после последней выгруженной строки."""
+        rows = [
+            json.loads(line)
+            for line in self.export('posts').decode().splitlines()
+        ]
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [post.pk for post in ExportTests.posts],
+        )
+        self.assertEqual(rows[0]['author'], 'auth')
+        position = f"{rows[2]['pub_date']}|{rows[2]['id']}"
+        rest = self.export('posts', '--after', position).decode()
+        self.assertEqual(
+            [json.loads(line)['id'] for line in rest.splitlines()],
+            [post.pk for post in ExportTests.posts[3:]],
+        )
+
+    def test_gzip_csv(self):
+        """CSV сжимается на лету."""
+        data = gzip.decompress(
+            self.export('comments', '--format', 'csv', '--gzip')
+        ).decode()
+        rows = list(csv.reader(StringIO(data)))
+        self.assertEqual(rows[0], ['id', 'pub_date', 'post', 'author',
+                                   'text'])
+        self.assertEqual(rows[1][-1], 'Комментарий')
+
+    def test_view_streams_for_staff_only(self):
+        """Выгрузка по HTTP идёт потоком и только для персонала."""
+        url = reverse('posts:export_data', kwargs={'name': 'posts'})
+        client = Client()
+        client.force_login(ExportTests.user)
+        self.assertEqual(client.get(url).status_code, 302)
+        response = self.admin_client.get(url, {'gzip': '1'})
+        self.assertTrue(response.streaming)
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(content.splitlines()), 5)
+        response = self.admin_client.get(url, {'after': 'вчера'})
+        self.assertEqual(response.status_code, 400)
@@ -1,17 +1,23 @@
 import shutil
 import tempfile
+from io import BytesIO
+
+from PIL import Image
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase, Client, override_settings
 from posts.models import Group, Post
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from posts.forms import PostForm
+
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -34,6 +40,7 @@ class PostCreateFormTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client_author = Client()
         self.authorized_client_author.force_login(PostCreateFormTests.user)
 
@@ -73,7 +80,9 @@ class PostCreateFormTests(TestCase):
             Post.objects.filter(
                 group=PostCreateFormTests.post.group,
                 text=PostCreateFormTests.post.text,
-                image='posts/small.gif'
+                image__regex=r'^posts/(\w\w/){2}\w{64}\.webp$',
+                image_width=2,
+                image_height=1,
             ).exists()
         )
 
@@ -101,3 +110,87 @@ class PostCreateFormTests(TestCase):
                 'post_id': PostCreateFormTests.post.id})
                              )
         self.assertEqual(Post.objects.count(), tasks_count)
+
+
+def photo(width, height, orientation=None):
+    """JPEG «с телефона»: с EXIF-поворотом и GPS-метаданными."""
+    exif = Image.Exif()
+    exif[0x010F] = 'Телефон'
+    if orientation:
+        exif[0x0112] = orientation
+    content = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(
+        content, 'JPEG', exif=exif.tobytes()
+    )
+    return SimpleUploadedFile('photo.jpg', content.getvalue(),
+                              content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIDE=100)
+class PostImageFormTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def form(self, upload):
+        return PostForm({'text': 'Пост'}, files={'image': upload})
+
+    def test_image_downscaled_rotated_and_stripped(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет EXIF."""
+        form = self.form(photo(400, 200, orientation=6))
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        image = Image.open(post.image)
+        self.assertEqual(image.format, 'WEBP')
+        self.assertEqual(image.size, (50, 100))
+        self.assertFalse(image.getexif())
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/webp;base64,')
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_large_image_rejected_before_decoding(self):
+        form = self.form(photo(400, 200))
+        self.assertFalse(form.is_valid())
+        self.assertIn('слишком большая', form.errors['image'][0])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class PostAdminFormTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(PostAdminFormTests.admin)
+
+    def test_add_and_change_author_in_admin(self):
+        """В админке пост создаётся с автором, автора можно сменить,
+        а картинка обрабатывается как на сайте."""
+        response = self.client.post(reverse('admin:posts_post_add'), {
+            'text': 'Пост из админки',
+            'author': PostAdminFormTests.author.pk,
+            'image': photo(400, 200),
+        })
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(text='Пост из админки')
+        self.assertEqual(post.author, PostAdminFormTests.author)
+        self.assertTrue(post.image.name.endswith('.webp'))
+        self.assertEqual((post.image_width, post.image_height), (400, 200))
+        response = self.client.post(
+            reverse('admin:posts_post_change', args=[post.pk]),
+            {'text': 'Пост из админки', 'author': PostAdminFormTests.admin.pk},
+        )
+        self.assertEqual(response.status_code, 302)
+        post.refresh_from_db()
+        self.assertEqual(post.author, PostAdminFormTests.admin)
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import AuthorStats, Group, Post
+from posts.search import SearchResults
+
+User = get_user_model()
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self, name, filename, content, *args):
+        path = os.path.join(self.directory.name, filename)
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write(content)
+        out = StringIO()
+        call_command('import_data', name, path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_users_groups_and_posts(self):
+        """Посты ссылаются на авторов и группы по именам, счётчики
+        и поиск пересчитываются после загрузки."""
+        self.load('users', 'users.csv',
+                  'username,first_name\nleo,Лев\nanna,Анна\n')
+        self.load('groups', 'groups.ndjson', json.dumps(
+            {'title': 'Проза', 'slug': 'prose'}, ensure_ascii=False
+        ))
+        posts = [
+            {'author': 'leo', 'group': 'prose', 'text': 'Война и мир',
+             'pub_date': '1869-01-01T00:00:00+00:00'},
+            {'author': 'leo', 'group': '', 'text': 'Анна Каренина'},
+            {'author': 'nobody', 'text': 'Пропадёт'},
+            {'author': 'anna', 'group': 'missing', 'text': 'Пропадёт'},
+        ]
+        output = self.load('posts', 'posts.ndjson', '\n'.join(
+            json.dumps(post, ensure_ascii=False) for post in posts
+        ), '--batch-size', '1')
+        self.assertIn(
+            'Записано строк: 2, из них новых: 2, пропущено: 2, '
+            'с ошибками: 0.', output
+        )
+        leo = User.objects.get(username='leo')
+        self.assertEqual(leo.first_name, 'Лев')
+        self.assertFalse(leo.has_usable_password())
+        war = Post.objects.get(text='Война и мир')
+        self.assertEqual(war.group, Group.objects.get(slug='prose'))
+        self.assertEqual(war.pub_date.year, 1869)
+        self.assertEqual(AuthorStats.objects.for_user(leo).posts, 2)
+        self.assertEqual(SearchResults('каренина').count(), 1)
+
+    def test_bad_rows_reported_and_duplicates_not_counted(self):
+        """Битые строки пропускаются с ошибкой, дубли не считаются
+        вставленными."""
+        User.objects.create_user(username='leo')
+        output = self.load('users', 'users.csv',
+                           'username,first_name\nleo,Лев\nanna,Анна\n')
+        self.assertIn('Записано строк: 2, из них новых: 1', output)
+        lines = [
+            json.dumps({'author': 'leo', 'text': 'Хороший пост'}),
+            json.dumps({'author': 'leo'}),
+            json.dumps({'author': 'leo', 'text': 'Дата',
+                        'pub_date': 'вчера'}),
+            '{не json',
+        ]
+        err = StringIO()
+        path = os.path.join(self.directory.name, 'posts.ndjson')
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write('\n'.join(lines))
+        out = StringIO()
+        call_command('import_data', 'posts', path, stdout=out, stderr=err)
+        self.assertIn('с ошибками: 3.', out.getvalue())
+        self.assertIn("строка 2: нет поля 'text'", err.getvalue())
+        self.assertIn('строка 3: не разобрать дату', err.getvalue())
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)),
+            ['Хороший пост'],
+        )
+
+    def test_export_round_trip(self):
+        """Выгрузка export_data загружается обратно."""
+        author = User.objects.create_user(username='auth')
+        Post.objects.create(author=author, text='Первый')
+        Post.objects.create(author=author, text='Второй')
+        path = os.path.join(self.directory.name, 'posts.csv.gz')
+        call_command('export_data', 'posts', '--format', 'csv', '--gzip',
+                     '--output', path)
+        Post.objects.all().delete()
+        call_command('import_data', 'posts', path, stdout=StringIO())
+        self.assertEqual(
+            list(Post.objects.order_by('pub_date').values_list(
+                'text', flat=True)),
+            ['Первый', 'Второй'],
+        )
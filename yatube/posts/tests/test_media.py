@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db.models.signals import post_save
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.storage import LOCK_FILE
+from posts import images, signals
+from posts.models import ImageBlob, Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+IMAGE = b'GIF89a\x01\x00\x01\x00\x00\x00\x00;'
+
+
+def files():
+    return sorted(
+        os.path.relpath(os.path.join(root, name), TEMP_MEDIA_ROOT)
+        for root, _, names in os.walk(TEMP_MEDIA_ROOT) for name in names
+        if name != LOCK_FILE
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ContentAddressedMediaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create(self, name='one.gif', content=IMAGE):
+        return Post.objects.create(
+            author=self.user, text='Пост', image=ContentFile(content, name)
+        )
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые картинки — один файл с двумя ссылками."""
+        first = self.create('one.gif')
+        second = self.create('two.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/(\w\w/){2}\w{64}\.gif$')
+        self.assertEqual(files(), [first.image.name])
+        self.assertEqual(
+            ImageBlob.objects.get(name=first.image.name).references, 2
+        )
+
+    def test_references_follow_edits_and_deletes(self):
+        first = self.create()
+        second = self.create()
+        name = first.image.name
+        second.image = ContentFile(IMAGE + b'\x00', 'other.gif')
+        second.save()
+        self.assertEqual(ImageBlob.objects.get(name=name).references, 1)
+        self.assertEqual(
+            ImageBlob.objects.get(name=second.image.name).references, 1
+        )
+        first.delete()
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_dedupe_media_moves_legacy_files(self):
+        storage = Post._meta.get_field('image').storage
+        legacy = []
+        for name in ('posts/a.gif', 'posts/b.gif'):
+            path = storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(IMAGE)
+            legacy.append(Post.objects.create(
+                author=self.user, text='Старый пост', image=name
+            ))
+        out = StringIO()
+        call_command('dedupe_media', '--dry-run', stdout=out)
+        self.assertIn('дублей: 1', out.getvalue())
+        self.assertEqual(files(), ['posts/a.gif', 'posts/b.gif'])
+
+        call_command('dedupe_media', stdout=StringIO())
+        names = set(Post.objects.filter(
+            pk__in=[post.pk for post in legacy]
+        ).values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertEqual(files(), [name])
+        self.assertEqual(ImageBlob.objects.get(name=name).references, 2)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class MediaDeletionTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_file_removed_with_last_reference(self):
+        user = User.objects.create_user(username='auth')
+        first, second = (
+            Post.objects.create(
+                author=user, text='Пост', image=ContentFile(IMAGE, 'a.gif')
+            )
+            for _ in range(2)
+        )
+        path = first.image.path
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_reupload_during_deletion_keeps_file(self):
+        """Удаление последней ссылки не удаляет файл, который тем
+        временем загрузили снова и ещё не успели записать в пост."""
+        user = User.objects.create_user(username='auth')
+        first = Post.objects.create(
+            author=user, text='Пост', image=ContentFile(IMAGE, 'a.gif')
+        )
+        name, path = first.image.name, first.image.path
+        # Ссылка последнего поста снята, удаление файла ещё впереди.
+        self.assertTrue(ImageBlob.objects.release(name))
+
+        def delete_in_between(sender, instance, **kwargs):
+            # Файл уже сохранён хранилищем, обработчик поста ещё
+            # не отработал — самое неудачное время для удаления.
+            images.delete(name)
+
+        post_save.disconnect(signals.post_created, sender=Post)
+        post_save.connect(delete_in_between, sender=Post)
+        post_save.connect(signals.post_created, sender=Post)
+        self.addCleanup(post_save.disconnect, delete_in_between, sender=Post)
+        second = Post.objects.create(
+            author=user, text='Пост', image=ContentFile(IMAGE, 'b.gif')
+        )
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(ImageBlob.objects.get(name=name).references, 1)
@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from posts.models import Group, Post
+from posts.models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -29,3 +30,50 @@ class PostModelTest(TestCase):
         expected_object_name_post = post.text
         self.assertEqual(expected_object_name_post, str(post))
         self.assertEqual(expected_object_name_group, str(group))
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return AuthorStats.objects.for_user(user)
+
+    def test_counters_follow_create_and_delete(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).posts, 1)
+        self.assertEqual(self.stats(self.author).followers, 1)
+        self.assertEqual(self.stats(self.reader).comments, 1)
+        self.assertEqual(self.stats(self.reader).following, 1)
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts, 0)
+        self.assertEqual(self.stats(self.author).followers, 0)
+        self.assertEqual(self.stats(self.reader).comments, 0)
+        self.assertEqual(self.stats(self.reader).following, 0)
+
+    def test_rebuild_restores_counters(self):
+        """Пересчёт восстанавливает рассинхронизированные счётчики."""
+        Post.objects.create(author=self.author, text='Пост 1')
+        Post.objects.create(author=self.author, text='Пост 2')
+        AuthorStats.objects.update(posts=100)
+        AuthorStats.objects.rebuild()
+        self.assertEqual(self.stats(self.author).posts, 2)
+        self.assertEqual(self.stats(self.reader).posts, 0)
+
+
+class FollowModelTest(TestCase):
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора невозможна."""
+        user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+        self.assertEqual(Follow.objects.count(), 1)
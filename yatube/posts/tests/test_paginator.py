@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Post
+from posts.paginator import CursorPaginator, POSTS_PER_PAGE
+
+User = get_user_model()
+POSTS_COUNT = 25
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        now = timezone.now()
+        for i in range(POSTS_COUNT):
+            post = Post.objects.create(author=cls.user, text=f'Пост {i}')
+            # Два поста с одинаковой датой проверяют разбор по id.
+            post.pub_date = now + timedelta(minutes=i // 2)
+            post.save()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def walk(self, direction, cursor=None):
+        pages = []
+        paginator = CursorPaginator(Post.objects.all(), POSTS_PER_PAGE)
+        while True:
+            page = paginator.get_page(cursor)
+            pages.append(page)
+            cursor = getattr(page, f'{direction}_cursor')
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_feed_without_gaps(self):
+        """Страницы вперёд дают всю ленту по порядку без повторов."""
+        pages = self.walk('next')
+        ids = [post.id for page in pages for post in page]
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+
+    def test_previous_page_returns_same_posts(self):
+        """Курсор назад возвращает ту же страницу, что и при пути вперёд."""
+        forward = self.walk('next')
+        backward = self.walk('previous', forward[-1].previous_cursor)
+        self.assertEqual(
+            [post.id for post in backward[0]],
+            [post.id for post in forward[-2]],
+        )
+        self.assertFalse(backward[-1].has_previous())
+
+    def test_page_costs_one_query_without_count(self):
+        """Любая страница — один запрос без COUNT(*)."""
+        pages = self.walk('next')
+        paginator = CursorPaginator(Post.objects.all(), POSTS_PER_PAGE)
+        with self.assertNumQueries(1):
+            page = paginator.get_page(pages[1].next_cursor)
+            list(page)
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            {'cursor': 'не-курсор'},
+        )
+        page_obj = response.context['page_obj']
+        self.assertFalse(page_obj.has_previous())
+        self.assertEqual(len(page_obj), POSTS_PER_PAGE)
@@ -0,0 +1,116 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from posts.search import SearchResults, filter_posts
+
+User = get_user_model()
+
+
+class SearchIndexMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth', is_staff=True,
+                                            is_superuser=True)
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Кот и ещё кот, кот на крыше'
+        )
+        cls.cat = Post.objects.create(
+            author=cls.user, text='Кот спит на диване'
+        )
+        cls.dog = Post.objects.create(
+            author=cls.user, text='Собака гуляет во дворе'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query):
+        return [post.pk for post in SearchResults(query)[:10]]
+
+    def test_ranked_by_relevance(self):
+        """Пост, где слово встречается чаще, выше в выдаче."""
+        self.assertEqual(self.found('КОТ'), [self.cats.pk, self.cat.pk])
+        self.assertEqual(SearchResults('кот').count(), 2)
+
+    def test_rare_words_weigh_more(self):
+        """Редкое слово запроса весит больше частого."""
+        raccoons = Post.objects.create(
+            author=self.user, text='кот енот енот енот'
+        )
+        cats = Post.objects.create(author=self.user, text='кот кот кот енот')
+        self.assertEqual(self.found('кот енот'), [raccoons.pk, cats.pk])
+
+    def test_all_words_required(self):
+        """Находятся только посты со всеми словами запроса."""
+        self.assertEqual(self.found('кот диване'), [self.cat.pk])
+        self.assertEqual(self.found('кот собака'), [])
+        self.assertEqual(self.found('"* OR NEAR('), [])
+
+    def test_index_follows_edit_and_delete(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        dog = Post.objects.get(pk=self.dog.pk)
+        dog.text = 'Кот прогнал собаку'
+        dog.save()
+        self.assertIn(dog.pk, self.found('кот'))
+        self.assertEqual(self.found('гуляет'), [])
+        Post.objects.filter(pk=self.cat.pk).delete()
+        self.assertNotIn(self.cat.pk, self.found('кот'))
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идёт по тому же индексу."""
+        self.assertEqual(
+            list(filter_posts(Post.objects.order_by('pk'), 'кот')),
+            [self.cats, self.cat],
+        )
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собака'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+@override_settings(POSTS_SEARCH_INDEX='fts5')
+class Fts5SearchTests(SearchIndexMixin, TestCase):
+    pass
+
+
+@override_settings(POSTS_SEARCH_INDEX='terms')
+class TermSearchTests(SearchIndexMixin, TestCase):
+    pass
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Кот номер {i}') for i in range(13)
+        )
+        # bulk_create обходит сигналы, индекс собирается целиком.
+        call_command('rebuild_search_index', stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_search_paginates_results(self):
+        """Результаты поиска разбиты на страницы."""
+        url = reverse('posts:search')
+        response = self.client.get(url, {'q': 'кот'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 13)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        response = self.client.get(url, {'q': 'кот', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_empty_query(self):
+        """Пустой запрос ничего не ищет."""
+        response = self.client.get(reverse('posts:search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 0)
@@ -1,5 +1,7 @@
 import shutil
 import tempfile
+import time
+from unittest import mock
 from django.utils import timezone
 from django.conf import settings
 from datetime import timedelta
@@ -7,9 +9,13 @@ from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
-from posts.models import Post, Group, Comment, Follow
+from posts import caching, fragments, thumbnails
+from posts.models import Post, Group, Comment, Follow, TimelineEntry
+from posts.paginator import COMMENTS_PER_PAGE
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -48,6 +54,7 @@ class PostVIEWSTests(TestCase):
             cls.post.save()
 
     def setUp(self):
+        cache.clear()
         self.authorized_client_author = Client()
         self.authorized_client_author.force_login(self.user)
 
@@ -198,7 +205,7 @@ class PostVIEWSTests(TestCase):
         self.context_test(test_post, response_profile)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class ImagePostViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -235,6 +242,7 @@ class ImagePostViewsTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client_author = Client()
         self.authorized_client_author.force_login(ImagePostViewsTests.user)
 
@@ -262,6 +270,152 @@ class ImagePostViewsTests(TestCase):
             }))
         self.assertEqual(response_post_detail.context['post'].image, post_image.image)
 
+    def test_thumbnail_pregenerated(self):
+        """Страница отдаёт заранее нарезанное превью."""
+        post = ImagePostViewsTests.post
+        self.assertIsNone(thumbnails.lookup(post.image, 'card'))
+        thumbnails.schedule(post)
+        thumbnail = thumbnails.lookup(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        response = self.authorized_client_author.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(response, thumbnail.url)
+
+    def test_image_srcset(self):
+        """Картинка отдаётся во всех ширинах карточки, лениво."""
+        post = ImagePostViewsTests.post
+        # THUMBNAIL_WORKERS = 0: превью нарежутся прямо в запросе.
+        response = self.authorized_client_author.get(reverse('posts:index'))
+        srcset = ', '.join(
+            f'{thumbnails.lookup(post.image, variant).url} {width}w'
+            for variant, width in thumbnails.SRCSET
+        )
+        self.assertContains(response, f'srcset="{srcset}"')
+        self.assertContains(response, 'loading="lazy"')
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_srcset_from_ready_widths(self):
+        """Пока нарезана только карточка 960, отдаётся она, а не
+        исходный файл."""
+        post = ImagePostViewsTests.post
+        geometry, options = thumbnails.VARIANTS['card']
+        card = thumbnails.backend.get_thumbnail(
+            post.image, geometry, **options
+        )
+        # Остальные ширины «уже режет» другой воркер.
+        cache.add(thumbnails._lock_key(post.image), 1)
+        response = self.authorized_client_author.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{card.url}"')
+        self.assertContains(response, f'srcset="{card.url} 960w"')
+        self.assertNotContains(response, f'src="{post.image.url}"')
+
+    def test_thumbnails_looked_up_once_per_page(self):
+        """Превью всех постов страницы читаются одним запросом."""
+        content = ImagePostViewsTests.post.image.read()
+        posts = [ImagePostViewsTests.post] + [
+            Post.objects.create(
+                author=ImagePostViewsTests.user,
+                text=f'Пост {i}',
+                image=SimpleUploadedFile(f'small_{i}.gif', content),
+            )
+            for i in range(3)
+        ]
+        for post in posts:
+            thumbnails.schedule(post)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client_author.get(
+                reverse('posts:index')
+            )
+        kv_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kv_queries), 1)
+        for post in posts:
+            self.assertContains(
+                response, thumbnails.lookup(post.image, 'card').url
+            )
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        # Ленты менялись раньше текущей секунды: иначе Last-Modified
+        # не отдаётся.
+        with mock.patch('time.time', return_value=time.time() - 10):
+            caching.get_generations([
+                caching.GLOBAL,
+                ('author', ConditionalGetTests.user.username),
+                ('post', ConditionalGetTests.post.id),
+            ])
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ConditionalGetTests.user)
+
+    def test_not_modified_without_queries(self):
+        """Актуальный ETag или дата дают 304 без запросов к БД."""
+        url = reverse('posts:index')
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=ConditionalGetTests.user, text='Новый')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_no_last_modified_in_changed_second(self):
+        """Пока не прошла секунда смены ленты, Last-Modified нет:
+        новый пост в ту же секунду не должен дать 304."""
+        url = reverse('posts:index')
+        Post.objects.create(author=ConditionalGetTests.user, text='Новый')
+        response = self.guest_client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        with mock.patch('time.time', return_value=time.time() + 2):
+            response = self.guest_client.get(url)
+        self.assertIn('Last-Modified', response)
+
+    def test_validators_depend_on_viewer(self):
+        """У пользователя свой ETag и нет Last-Modified."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={
+                'username': ConditionalGetTests.user.username}),
+            reverse('posts:post_detail', kwargs={
+                'post_id': ConditionalGetTests.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                guest = self.guest_client.get(url)
+                user = self.authorized_client.get(url)
+                self.assertNotEqual(guest['ETag'], user['ETag'])
+                self.assertIn('Last-Modified', guest)
+                self.assertNotIn('Last-Modified', user)
+                self.assertIn('private', user['Cache-Control'])
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=guest['ETag']
+                )
+                self.assertEqual(response.status_code, 200)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        response = self.authorized_client.get(
+            reverse('posts:follow_index'),
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, 304)
+
 
 class CommentPostViewsTest(TestCase):
     @classmethod
@@ -285,6 +439,7 @@ class CommentPostViewsTest(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(CommentPostViewsTest.user)
 
@@ -297,6 +452,56 @@ class CommentPostViewsTest(TestCase):
         self.assertEqual(result_comment, test_comment)
 
 
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        for i in range(COMMENTS_PER_PAGE + 5):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader_{i}'),
+                text=f'Комментарий {i}',
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_first_comments_on_post_page(self):
+        """На странице поста только первая порция свежих комментариев."""
+        response = self.client.get(reverse(
+            'posts:post_detail',
+            kwargs={'post_id': CommentPaginationTests.post.id}
+        ))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(
+            comments[0].text, f'Комментарий {COMMENTS_PER_PAGE + 4}'
+        )
+        self.assertContains(response, comments.next_cursor)
+
+    def test_load_more_comments(self):
+        """Фрагмент отдаёт остальные комментарии одним запросом
+        вместе с авторами."""
+        url = reverse(
+            'posts:post_comments',
+            kwargs={'post_id': CommentPaginationTests.post.id}
+        )
+        first = self.client.get(url).context['comments']
+        # Пост для 404 и комментарии с авторами.
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'cursor': first.next_cursor})
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Комментарий {i}' for i in range(4, -1, -1)],
+        )
+        self.assertFalse(comments.has_next())
+        self.assertContains(response, 'reader_0')
+
+
 class CacheIndexTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -313,20 +518,71 @@ class CacheIndexTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
 
     def test_comments_in_post(self):
-        """Проверка наличие комментайрия на посте."""
+        """Главная берётся из кеша, пока посты не изменились."""
+        cache.clear()
         response = self.guest_client.get(reverse('posts:index'))
         post1 = response.content
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(post1, response.content)
         Post.objects.all().delete()
         response = self.guest_client.get(reverse('posts:index'))
         post2 = response.content
-        self.assertIn(post1, post2)
+        self.assertNotEqual(post1, post2)
+        self.assertNotIn(CacheIndexTests.post.text.encode(), post2)
+
+    def test_pages_invalidated_by_comment_and_follow(self):
+        """Комментарий и подписка обновляют закешированные страницы."""
         cache.clear()
+        post_url = reverse('posts:post_detail', kwargs={
+            'post_id': CacheIndexTests.post.id})
+        self.guest_client.get(post_url)
+        Comment.objects.create(
+            author=CacheIndexTests.user,
+            post=CacheIndexTests.post,
+            text='Свежий комментарий'
+        )
+        response = self.guest_client.get(post_url)
+        self.assertIn('Свежий комментарий', response.content.decode())
+        reader = User.objects.create_user(username='reader')
+        client = Client()
+        client.force_login(reader)
+        profile_url = reverse('posts:profile', kwargs={
+            'username': CacheIndexTests.user.username})
+        client.get(profile_url)
+        Follow.objects.create(user=reader, author=CacheIndexTests.user)
+        response = client.get(profile_url)
+        self.assertTrue(response.context['following'])
+
+    def test_pages_invalidated_by_group_and_author_rename(self):
+        """Смена адреса группы и имени автора обновляет страницы
+        с постами, а не только ленту группы."""
+        group = Group.objects.create(title='Группа', slug='old_slug')
+        post = Post.objects.create(
+            author=CacheIndexTests.user, text='Пост в группе', group=group
+        )
+        profile_url = reverse('posts:profile', kwargs={
+            'username': CacheIndexTests.user.username})
+        post_url = reverse('posts:post_detail', kwargs={'post_id': post.id})
+        self.guest_client.get(profile_url)
+        self.guest_client.get(post_url)
+        group.slug = 'new_slug'
+        group.save()
+        for url in (profile_url, post_url):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, '/group/new_slug/')
+                self.assertNotContains(response, '/group/old_slug/')
+        self.guest_client.get(reverse('posts:index'))
+        CacheIndexTests.user.first_name = 'Новое'
+        CacheIndexTests.user.last_name = 'Имя'
+        CacheIndexTests.user.save()
         response = self.guest_client.get(reverse('posts:index'))
-        post3 = response.content
-        self.assertNotIn(post2, post3)
+        self.assertContains(response, 'Новое Имя')
 
 
 class FollowUserTests(TestCase):
@@ -350,6 +606,7 @@ class FollowUserTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(FollowUserTests.user1)
         self.authorized_client_two = Client()
@@ -378,3 +635,237 @@ class FollowUserTests(TestCase):
         response_two = self.authorized_client_two.get('/follow/')
         text_user3 = response_two.context['page_obj']
         self.assertNotEqual(text_user3, FollowUserTests.post2.text)
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        for i in range(10):
+            Post.objects.create(
+                author=User.objects.create_user(username=f'user_{i}'),
+                group=Group.objects.create(
+                    title=f'Группа {i}',
+                    slug=f'slug_{i}',
+                    description='Описание',
+                ),
+                text=f'Тестовый пост {i}',
+            )
+            Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Пост автора {i}',
+            )
+        Follow.objects.create(user=cls.author, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(FeedQueriesTests.author)
+
+    def test_feed_pages_query_count(self):
+        """Автор и группа постов не дозагружаются по одному."""
+        pages_queries = {
+            reverse('posts:index'): 1,
+            reverse('posts:group_posts', kwargs={
+                'slug': FeedQueriesTests.group.slug}): 2,
+            reverse('posts:profile', kwargs={
+                'username': FeedQueriesTests.author.username}): 4,
+        }
+        for url, queries in pages_queries.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.guest_client.get(url)
+
+    def test_follow_index_query_count(self):
+        """Лента подписок: сессия, пользователь, популярные авторы
+        для ключа кеша, записи ленты, посты по ним и посты популярных
+        авторов."""
+        with self.assertNumQueries(6):
+            self.authorized_client.get(reverse('posts:follow_index'))
+
+    def test_post_detail_query_count(self):
+        """Пост загружается вместе с автором и группой."""
+        post = Post.objects.filter(author=FeedQueriesTests.author).first()
+        with self.assertNumQueries(4):
+            self.guest_client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.id})
+            )
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        for i in range(8):
+            Post.objects.create(author=cls.author, text=f'Пост автора {i}')
+            Post.objects.create(author=cls.star, text=f'Пост звезды {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(TimelineTests.reader)
+
+    def follow_feed_ids(self):
+        ids = []
+        cursor = None
+        while True:
+            response = self.client.get(
+                reverse('posts:follow_index'),
+                {'cursor': cursor} if cursor else {},
+            )
+            page_obj = response.context['page_obj']
+            ids += [post.id for post in page_obj]
+            cursor = page_obj.next_cursor
+            if cursor is None:
+                return ids
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет ленту, отписка её очищает."""
+        self.client.get(reverse('posts:profile_follow', kwargs={
+            'username': TimelineTests.author.username}))
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=TimelineTests.reader).count(),
+            8,
+        )
+        post = Post.objects.create(author=TimelineTests.author, text='Новый')
+        self.assertIn(post.id, self.follow_feed_ids())
+        self.client.get(reverse('posts:profile_unfollow', kwargs={
+            'username': TimelineTests.author.username}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=TimelineTests.reader).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_famous_author_posts_read_on_request(self):
+        """Посты популярного автора подмешиваются при чтении ленты."""
+        Follow.objects.create(
+            user=TimelineTests.author, author=TimelineTests.star
+        )
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.star
+        )
+        Post.objects.create(author=TimelineTests.star, text='Свежий пост')
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=TimelineTests.reader).exists()
+        )
+        expected = list(
+            Post.objects.filter(author=TimelineTests.star).order_by(
+                '-pub_date', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self.follow_feed_ids(), expected)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_famous_author_bumps_one_generation(self):
+        """Пост популярного автора меняет одну метку, а не метки всех
+        подписчиков, и лента подписок всё равно обновляется."""
+        star = TimelineTests.star
+        Follow.objects.create(user=TimelineTests.reader, author=star)
+        self.follow_feed_ids()
+        post = Post.objects.create(author=star, text='Свежий пост')
+        scopes = caching.scopes_for_post(post)
+        self.assertIn(('famous', star.pk), scopes)
+        self.assertNotIn(('follower', TimelineTests.reader.pk), scopes)
+        self.assertEqual(self.follow_feed_ids()[0], post.id)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, TIMELINE_WORKERS=0)
+    def test_author_dropping_below_limit_keeps_posts_in_feeds(self):
+        """Посты, написанные, пока автор был популярен, не пропадают
+        из лент, когда подписчиков становится меньше порога."""
+        star = TimelineTests.star
+        others = [
+            User.objects.create_user(username=f'fan{i}') for i in range(2)
+        ]
+        for user in others:
+            Follow.objects.create(user=user, author=star)
+        post = Post.objects.create(author=star, text='Пост звезды')
+        # Подписка без backfill: автор популярен.
+        Follow.objects.create(user=TimelineTests.reader, author=star)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=TimelineTests.reader).exists()
+        )
+        for user in others:
+            Follow.objects.filter(user=user, author=star).delete()
+        feed = self.follow_feed_ids()
+        self.assertIn(post.id, feed)
+        self.assertEqual(
+            feed,
+            list(Post.objects.filter(author=star).order_by(
+                '-pub_date', '-id').values_list('id', flat=True)),
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_spread_scheduled_once_on_crossing(self):
+        """Раскладку ставит в очередь только отписка, которая опустила
+        автора ниже порога."""
+        star = TimelineTests.star
+        fans = [
+            User.objects.create_user(username=f'fan{i}') for i in range(3)
+        ]
+        for user in fans:
+            Follow.objects.create(user=user, author=star)
+        with mock.patch('posts.timeline.schedule_spread') as schedule:
+            for user in fans:
+                Follow.objects.filter(user=user, author=star).delete()
+        schedule.assert_called_once_with(star.pk)
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_user(username='admin', is_staff=True)
+        cls.post = Post.objects.create(author=cls.user, text='Старый текст')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(PostCardCacheTests.user)
+
+    def test_card_cached_until_edit(self):
+        """Карточка берётся из кеша и обновляется после правки поста."""
+        post = PostCardCacheTests.post
+        first = fragments.render_cards([post])
+        post.text = 'Текст без правки в базе'
+        self.assertEqual(fragments.render_cards([post]), first)
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Новый текст'},
+        )
+        post.refresh_from_db()
+        self.assertIn('Новый текст', fragments.render_cards([post])[post.pk])
+        self.assertEqual(
+            fragments.card_stats(),
+            {'hits': 1, 'misses': 2, 'hit_ratio': round(1 / 3, 4)},
+        )
+
+    def test_card_refreshed_on_author_rename(self):
+        """Карточка не переживает смену имени и логина автора."""
+        author = User.objects.create_user(username='old_name')
+        post = Post.objects.create(author=author, text='Пост')
+        fragments.render_cards([post])
+        author.username = 'new_name'
+        author.first_name = 'Новое'
+        author.save()
+        card = fragments.render_cards([post])[post.pk]
+        self.assertIn('Новое', card)
+        self.assertIn('/profile/new_name/', card)
+
+    def test_stats_endpoint_for_staff_only(self):
+        """Статистика кеша доступна только персоналу."""
+        url = reverse('posts:cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(PostCardCacheTests.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.json()['post_cards']['misses'], 0)
@@ -0,0 +1,193 @@
+"""Заранее нарезанные превью картинок постов.
+
+Шаблоны раньше вызывали {% thumbnail %}, и первый зритель нового поста
+ждал, пока PIL уменьшит картинку, а несколько воркеров могли резать
+один и тот же файл одновременно. Теперь post_create и post_edit
+отправляют картинку в пул фоновых потоков, который режет все варианты
+из VARIANTS, а шаблоны только читают готовые превью из KV-хранилища
+sorl и, пока превью нет, показывают исходную картинку.
+
+Карточка нарезается в нескольких ширинах (SRCSET): телефон по srcset
+берёт узкое превью, а не 960 пикселей, которые он всё равно ужмёт.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from . import caching
+
+logger = logging.getLogger(__name__)
+
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+
+# Все геометрии, которые используют шаблоны постов.
+VARIANTS = {
+    'card': ('960x339', CARD_OPTIONS),
+    'card_640': ('640x226', CARD_OPTIONS),
+    'card_320': ('320x113', CARD_OPTIONS),
+}
+
+# Варианты карточки для srcset и их ширина, от узкого к широкому.
+SRCSET = (('card_320', 320), ('card_640', 640), ('card', 960))
+
+THUMBNAIL_LOCK_TIMEOUT = 5 * 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class PrecomputedBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет искать превью, не создавая его."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        # Опции собираются так же, как в ThumbnailBackend.get_thumbnail,
+        # иначе имя превью не совпадёт с нарезанным.
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_cached(self, file_, geometry_string, **options):
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options)
+        )
+
+
+backend = PrecomputedBackend()
+
+
+def lookup(image, variant):
+    """Готовое превью варианта или None, если его ещё не нарезали."""
+    if not image:
+        return None
+    geometry, options = VARIANTS[variant]
+    return backend.get_cached(image, geometry, **options)
+
+
+def lookup_many(posts, variants=VARIANTS):
+    """Готовые превью картинок постов:
+    {вариант: {id поста: превью или None}}.
+
+    То же, что lookup для каждого поста и варианта, но KV-хранилище
+    sorl читается одним get_many из кеша и одним запросом к БД
+    для промахов.
+    """
+    posts = [post for post in posts if post.image]
+    keys = {
+        (variant, post.pk): add_prefix(backend.thumbnail_file(
+            post.image, VARIANTS[variant][0], **VARIANTS[variant][1]
+        ).key)
+        for variant in variants for post in posts
+    }
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(keys.values())
+    missing = set(keys.values()) - set(values)
+    if missing:
+        stored = dict(
+            KVStore.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        # Как cached_db: отсутствие тоже кешируется, пока превью
+        # не нарежут и sorl не перезапишет ключ.
+        found = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        kv_cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    found = {variant: {} for variant in variants}
+    for (variant, pk), key in keys.items():
+        found[variant][pk] = (
+            None if values[key] == EMPTY_VALUE
+            else deserialize_image_file(values[key])
+        )
+    return found
+
+
+class PageThumbnails:
+    """Превью всех постов страницы для контекста шаблона.
+
+    Хранилище читается при первом обращении и сразу за всю страницу
+    и все варианты; если карточки взяты из кеша, запросов нет вовсе.
+    """
+
+    def __init__(self, posts):
+        self.posts = posts
+        self.variants = None
+
+    def get(self, post, variant='card'):
+        if self.variants is None:
+            self.variants = lookup_many(self.posts)
+        found = self.variants[variant]
+        if post.pk in found:
+            return found[post.pk]
+        return lookup(post.image, variant)
+
+
+def generate(image):
+    """Режет все варианты картинки; уже готовые sorl пропускает."""
+    for geometry, options in VARIANTS.values():
+        backend.get_thumbnail(image, geometry, **options)
+
+
+def _lock_key(image):
+    return f'thumbnails:lock:{image.name}'
+
+
+def _run(post):
+    try:
+        generate(post.image)
+        # Карточки и страницы с исходной картинкой больше не нужны.
+        caching.bump_generations(caching.scopes_for_post(post))
+    except Exception:
+        logger.exception('Не удалось нарезать превью %s', post.image.name)
+    finally:
+        cache.delete(_lock_key(post.image))
+        # Поток пула сам открыл соединение с БД для KV-хранилища sorl.
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def schedule(post):
+    """Ставит картинку поста в очередь на нарезку.
+
+    Одну картинку режет только один воркер: блокировка лежит в общем
+    кеше. При THUMBNAIL_WORKERS = 0 режет сразу, в текущем потоке,
+    и возвращает True, если превью уже готовы.
+    """
+    image = post.image
+    if not image:
+        return False
+    if not settings.THUMBNAIL_WORKERS:
+        generate(image)
+        return True
+    if cache.add(_lock_key(image), 1, THUMBNAIL_LOCK_TIMEOUT):
+        _get_executor().submit(_run, post)
+    return False
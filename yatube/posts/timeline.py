@@ -0,0 +1,203 @@
+"""Лента подписок: гибрид fan-out on write и fan-out on read.
+
+Посты обычных авторов раскладываются по TimelineEntry подписчиков
+в момент публикации. Авторы, у которых подписчиков не меньше
+TIMELINE_FANOUT_LIMIT, ничего не раскладывают — их посты читаются
+напрямую из Post и сливаются с лентой при выдаче страницы.
+
+Когда автор опускается ниже порога, его посты перестают подмешиваться
+при чтении, поэтому spread раскладывает их по лентам всех подписчиков:
+и посты, написанные, пока он был популярен, и тем, кто тогда
+подписался без backfill. У такого автора около тысячи подписчиков,
+поэтому раскладка идёт в фоновом потоке, а не в запросе отписки.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+
+from core import db_router
+
+from . import caching
+from .bulk import batches
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginator import (POSTS_PER_PAGE, CursorPaginator, is_backward,
+                        keyset_slice)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+# Раскладка одного автора идёт не дольше, чем держится блокировка.
+SPREAD_LOCK_TIMEOUT = 60 * 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def is_famous(author_id):
+    """Слишком много подписчиков для раскладки при записи."""
+    stats = AuthorStats.objects.filter(user_id=author_id).first()
+    return (
+        stats is not None
+        and stats.followers >= settings.TIMELINE_FANOUT_LIMIT
+    )
+
+
+def _insert(entries):
+    # Не batch_size: в Django 2.2 он не урезается до лимитов SQLite.
+    for batch in batches(entries, BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_famous(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _insert(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все посты нового автора."""
+    if is_famous(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts.iterator()
+    )
+
+
+def spread(author_id):
+    """Раскладывает все посты автора по лентам всех его подписчиков."""
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    for chunk in batches(posts.iterator(), BATCH_SIZE):
+        _insert(
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for user_id in followers.iterator()
+            for pk, pub_date in chunk
+        )
+
+
+def _spread_lock_key(author_id):
+    return f'timeline:spread:{author_id}'
+
+
+def _run_spread(author_id):
+    try:
+        # Реплика могла ещё не догнать только что закоммиченную отписку.
+        with db_router.use_primary():
+            spread(author_id)
+            # Ленты подписчиков могли закешироваться, пока шла раскладка.
+            caching.bump_generations(caching.follower_scopes([author_id]))
+    except Exception:
+        logger.exception('Не удалось разложить посты автора %s', author_id)
+    finally:
+        cache.delete(_spread_lock_key(author_id))
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TIMELINE_WORKERS,
+                thread_name_prefix='timeline',
+            )
+        return _executor
+
+
+def schedule_spread(author_id):
+    """Ставит раскладку постов автора в очередь после коммита.
+
+    Одного автора раскладывает один поток: блокировка лежит в общем
+    кеше. При TIMELINE_WORKERS = 0 раскладывает сразу, в текущем потоке.
+    """
+    if not settings.TIMELINE_WORKERS:
+        spread(author_id)
+        return
+    if cache.add(_spread_lock_key(author_id), 1, SPREAD_LOCK_TIMEOUT):
+        # Поток увидит отписку и посты, только когда они закоммичены.
+        transaction.on_commit(
+            lambda: _get_executor().submit(_run_spread, author_id)
+        )
+
+
+def follower_lost(author_id):
+    """Уменьшает счётчик подписчиков автора после отписки; автор,
+    опустившийся этим ниже TIMELINE_FANOUT_LIMIT, переходит на
+    раскладку при записи."""
+    with transaction.atomic():
+        # Значение до уменьшения читается под блокировкой строки
+        # (в SQLite писатель и так один), поэтому из параллельных
+        # отписок порог переходит ровно одна.
+        before = AuthorStats.objects.select_for_update().filter(
+            user_id=author_id
+        ).values_list('followers', flat=True).first()
+        AuthorStats.objects.bump(author_id, followers=-1)
+    if before == settings.TIMELINE_FANOUT_LIMIT:
+        schedule_spread(author_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild():
+    """Собирает все ленты заново по Follow и Post."""
+    TimelineEntry.objects.all().delete()
+    follows = Follow.objects.values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        backfill(user_id, author_id)
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок: TimelineEntry плюс посты популярных авторов."""
+
+    def __init__(self, user, per_page=POSTS_PER_PAGE):
+        super().__init__(
+            TimelineEntry.objects.filter(user=user).order_by(
+                '-pub_date', '-post'
+            ),
+            per_page,
+        )
+        self.user = user
+
+    def fetch(self, direction, pub_date, pk, limit):
+        post_ids = keyset_slice(
+            self.object_list.values_list('post_id', flat=True),
+            direction, pub_date, pk, limit,
+            fields=('pub_date', 'post_id'),
+        )
+        posts = Post.objects.feed().in_bulk(post_ids)
+        rows = [posts[post_id] for post_id in post_ids if post_id in posts]
+        famous = Post.objects.feed().filter(
+            author__following__user=self.user,
+            author__stats__followers__gte=settings.TIMELINE_FANOUT_LIMIT,
+        )
+        rows += keyset_slice(famous, direction, pub_date, pk, limit)
+        unique = {post.pk: post for post in rows}.values()
+        return sorted(
+            unique,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not is_backward(direction),
+        )[:limit]
@@ -1,69 +1,80 @@
-from django.core.paginator import Paginator
 from django.shortcuts import (render, get_object_or_404,
                               redirect, reverse,
                               )
-from .models import Post, Group, User, Comment, Follow
+from .models import Post, Group, User, Comment, Follow, AuthorStats
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import (Http404, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from .forms import PostForm, CommentForm
-from django.views.decorators.cache import cache_page
+from .paginator import (COMMENTS_PER_PAGE, POSTS_PER_PAGE,
+                        CursorPaginator, paginate)
+from .search import SearchResults
+from .timeline import TimelinePaginator
+from . import caching, export, fragments, thumbnails
 
 
-@cache_page(20, key_prefix='index_page')
+@caching.cache_by_generation('index', caching.index_page_scopes)
 def index(request):
-    post_list = Post.objects.order_by('-pub_date')
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.feed()
+    page_obj = paginate(request, post_list)
     context = {
         'page_obj': page_obj,
+        'thumbnails': thumbnails.PageThumbnails(page_obj),
     }
     return render(request, 'posts/index.html', context)
 
 
+@caching.cache_by_generation('group', caching.group_page_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.filter(group=group).order_by('-pub_date')
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.feed().filter(group=group)
+    page_obj = paginate(request, post_list)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'thumbnails': thumbnails.PageThumbnails(page_obj),
         'posts': post_list
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@caching.cache_by_generation('profile', caching.profile_page_scopes)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=author).order_by('-pub_date')
-    count = post_list.count()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.feed().filter(author=author)
+    stats = AuthorStats.objects.for_user(author)
+    page_obj = paginate(request, post_list)
     following = Follow.objects.filter(
         user__username=request.user.username, author=author
     ).exists()
     context = {
-        'count': count,
+        'count': stats.posts,
+        'stats': stats,
         'author': author,
         'page_obj': page_obj,
+        'thumbnails': thumbnails.PageThumbnails(page_obj),
         'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@caching.cache_by_generation('post', caching.post_page_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.feed(), id=post_id)
     text = post.text[:30]
     author = post.author
-    count = Post.objects.filter(author=author).count()
+    stats = AuthorStats.objects.for_user(author)
     form = CommentForm()
-    comments = Comment.objects.filter(post=post_id)
+    comments = CursorPaginator(
+        Comment.objects.for_post(post_id), COMMENTS_PER_PAGE
+    ).get_page(None)
     context = {
         'post': post,
         'author': author,
-        'count': count,
+        'count': stats.posts,
+        'stats': stats,
         'text': text,
         'form': form,
         'comments': comments
@@ -71,6 +82,32 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), POSTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'thumbnails': thumbnails.PageThumbnails(page_obj),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@caching.cache_by_generation('comments', caching.comments_page_scopes)
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = CursorPaginator(
+        Comment.objects.for_post(post_id), COMMENTS_PER_PAGE
+    ).get_page(request.GET.get('cursor'))
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None,
@@ -79,6 +116,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        thumbnails.schedule(post)
         username = request.user
         return redirect(reverse('posts:profile', kwargs={
             'username': username})
@@ -98,6 +136,8 @@ def post_edit(request, post_id):
     if form.is_valid():
         form.save(commit=False)
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect(f'/posts/{post_id}/')
     return render(request, 'posts/create_post.html', {'form': form, 'is_edit': is_edit})
 
@@ -115,14 +155,13 @@ def add_comment(request, post_id):
 
 
 @login_required
+@caching.cache_by_generation('follow', caching.follow_page_scopes)
 def follow_index(request):
-    author = request.user
-    post_list = Post.objects.filter(author__following__user=author)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = TimelinePaginator(request.user)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'thumbnails': thumbnails.PageThumbnails(page_obj),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -144,3 +183,34 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
+
+
+@staff_member_required
+def cache_stats(request):
+    return JsonResponse({'post_cards': fragments.card_stats()})
+
+
+@staff_member_required
+def export_data(request, name):
+    """Потоковая выгрузка: ?format=ndjson|csv, ?after=pub_date|id, ?gzip=1."""
+    if name not in export.EXPORTS:
+        raise Http404
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in export.FORMATS:
+        return HttpResponseBadRequest('Формат: ndjson или csv.')
+    after = None
+    if request.GET.get('after'):
+        try:
+            after = export.parse_position(request.GET['after'])
+        except ValueError:
+            return HttpResponseBadRequest('after: позиция «pub_date|id».')
+    compress = bool(request.GET.get('gzip'))
+    response = StreamingHttpResponse(
+        export.stream(name, export_format, after, compress),
+        content_type=(
+            'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        ),
+    )
+    filename = f'{name}.{export_format}' + ('.gz' if compress else '')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
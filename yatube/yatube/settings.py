@@ -48,13 +48,17 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
     'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.NPlusOneMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.PrimaryPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -68,7 +72,8 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django-шаблоны с замером времени рендеринга для /metrics/.
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -93,7 +98,61 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # Сколько секунд держать соединение между запросами; 0 — закрывать.
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 60)),
+    },
+    # Копия default для чтения; локально её наполняет replicate_sqlite.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get(
+            'YATUBE_REPLICA_NAME', os.path.join(BASE_DIR, 'db.replica.sqlite3')
+        ),
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 60)),
+    },
+}
+DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+# Алиасы, с которых читают ленты: YATUBE_REPLICAS=replica. Пусто — default.
+REPLICA_DATABASES = [
+    alias for alias in os.environ.get('YATUBE_REPLICAS', '').split(',')
+    if alias
+]
+# Сколько секунд после записи сессия читает из default.
+REPLICA_PIN_SECONDS = 5
+
+# Метрики запросов, см. core/metrics.py. /metrics/ открыт с заголовком
+# «Authorization: Bearer METRICS_TOKEN» (bearer_token в Prometheus),
+# а без токена — только с адресов METRICS_ALLOWED_IPS и не через
+# прокси: за прокси все запросы приходят с его адреса. Медленные
+# запросы из доли METRICS_SAMPLE_RATE пишутся в лог с
+# METRICS_TOP_QUERIES долгими SQL.
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+METRICS_SAMPLE_RATE = 0.1
+METRICS_SLOW_SECONDS = 0.5
+METRICS_TOP_QUERIES = 5
+
+# Поиск N+1, см. core/nplusone.py: 'raise' — ошибка (тесты включают
+# сами), 'log' — предупреждение (стейджинг), пусто — выключен.
+NPLUSONE_MODE = os.environ.get('YATUBE_NPLUSONE', '')
+# Сколько одинаковых SELECT из одного места считать N+1.
+NPLUSONE_THRESHOLD = 3
+# Имя вьюхи ('*' — любая): подстроки SQL, повторы которых допустимы.
+NPLUSONE_ALLOWED = {}
+# Допустимо, только когда превью режутся прямо в запросе
+# (THUMBNAIL_WORKERS = 0): sorl читает KV-хранилище на каждый вариант.
+# С фоновой нарезкой повтор этих запросов — настоящий N+1.
+NPLUSONE_ALLOWED_INLINE_THUMBNAILS = ['"thumbnail_kvstore"']
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# PRAGMA для каждого нового соединения SQLite, см. core/db.py.
+# busy_timeout идёт первым: смена journal_mode тоже ждёт блокировку.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
 }
 
 
@@ -147,4 +206,60 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
-}
\ No newline at end of file
+}
+# YATUBE_CACHE=two_tier: у каждого процесса свой LRU перед общим
+# файловым кешем, инвалидация между процессами — по штампам версий.
+# Вместо 'shared' можно подставить любой общий бэкенд, например Redis.
+if os.environ.get('YATUBE_CACHE') == 'two_tier':
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.TwoTierCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'LOCAL_MAX_ENTRIES': 2000,
+                'LOCAL_TIMEOUT': 60,
+                'STAMP_INTERVAL': 1,
+                # KV-хранилище sorl пишут фоновые потоки нарезки: его
+                # записи меняли бы штамп и сбрасывали локальные уровни
+                # всех процессов.
+                'SHARED_ONLY_PREFIXES': [
+                    'generation:', 'cards:', 'thumbnails:', 'sorl-thumbnail',
+                ],
+            },
+        },
+        # По умолчанию файловый кеш держит 300 записей и при переполнении
+        # выкидывает треть случайных, вместе с метками поколений и
+        # штампом: страницы и локальные уровни сбрасывались бы
+        # постоянно. Лимит — с запасом на страницы, карточки и метки.
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache'),
+            'TIMEOUT': None,
+            'OPTIONS': {
+                'MAX_ENTRIES': 200_000,
+                'CULL_FREQUENCY': 10,
+            },
+        },
+    }
+# Авторы с таким числом подписчиков не раскладывают посты по лентам
+# при публикации: их посты подмешиваются в ленту при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Потоки фоновой раскладки постов автора, опустившегося ниже порога;
+# 0 — раскладывать сразу в запросе отписки.
+TIMELINE_WORKERS = 1
+# Страницы лент инвалидируются по поколениям, TTL лишь подчищает кеш.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# Потоки фоновой нарезки превью; 0 — резать сразу в запросе.
+THUMBNAIL_WORKERS = 2
+
+# Загруженные картинки постов, см. posts/images.py: большая сторона
+# не длиннее POST_IMAGE_MAX_SIDE, формат и качество копии, бюджет
+# декодирования — картинки больше POST_IMAGE_MAX_PIXELS отвергаются.
+POST_IMAGE_MAX_SIDE = 2048
+POST_IMAGE_FORMAT = 'WEBP'
+POST_IMAGE_QUALITY = 80
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
+# Поисковый индекс постов: 'fts5', 'terms' или None — FTS5, если есть.
+POSTS_SEARCH_INDEX = None
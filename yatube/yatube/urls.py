@@ -4,6 +4,8 @@ from django.conf.urls.static import static
 from django.urls import path, include
 import debug_toolbar
 
+from core.views import prometheus_metrics
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('group/', include('posts.urls', namespace='posts')),
@@ -11,7 +13,9 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('api.urls', namespace='api')),
     path('posts/', include('posts.urls', namespace='posts')),
+    path('metrics/', prometheus_metrics, name='metrics'),
 
 ]
 handler404 = 'core.views.page_not_found'